@@ -1,9 +1,32 @@
 import os
 import re
 import argparse
-from typing import Pattern, List, Tuple, Optional
+import concurrent.futures
+import mmap
+import pickle
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, BinaryIO, Dict, Iterator, Pattern, List, Tuple, Optional
 import pathspec
 
+# Files per unit of work for the content search workers
+CONTENT_BATCH_SIZE = 64
+
+# Batches per worker thread that may be searched ahead of the one being reported
+PENDING_BATCHES_PER_JOB = 4
+
+# Bytes read from the start of a file to decide whether it is binary
+BINARY_SNIFF_BYTES = 8192
+
+# Word characters that extend a content match: alphanumerics and underscore, as str.isalnum()
+# defines them for text and ASCII-only for the memory-mapped bytes search
+WORD_TAIL = re.compile(r'\w*')
+WORD_TAIL_BYTES = re.compile(rb'\w*')
+
+# Files and directories modified this recently are not cached: a change within the same
+# timestamp tick would leave their mtime unchanged
+CACHE_MIN_AGE_NS = 2 * 10**9
+
 def load_gitignore_spec(directory: str, gitignore_path: str) -> Optional[pathspec.PathSpec]:
 	"""Loads gitignore patterns from a file."""
 	if not os.path.isabs(gitignore_path):
@@ -16,7 +39,261 @@ def load_gitignore_spec(directory: str, gitignore_path: str) -> Optional[pathspe
 	with open(gitignore_path, 'r') as f:
 		return pathspec.PathSpec.from_lines('gitwildmatch', f)
 
-def get_matching_filenames(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None) -> List[str]:
+def _spec_key(spec: Optional[pathspec.PathSpec]) -> Optional[Tuple]:
+	"""Returns a hashable fingerprint of the ignore patterns in spec."""
+	if not spec:
+		return None
+	return tuple((p.include, p.regex.pattern if p.regex else None) for p in spec.patterns)
+
+def _is_settled(mtime_ns: int) -> bool:
+	"""Tells whether something modified at mtime_ns is old enough to be cached."""
+	return time.time_ns() - mtime_ns >= CACHE_MIN_AGE_NS
+
+class ScanCache:
+	"""
+	On-disk cache that lets repeat scans of the same tree skip unchanged work.
+
+	It keeps two kinds of entries:
+	- Gitignore filtering results per directory, keyed by the directory's path, mtime and
+	  inode and the ignore patterns. Adding, removing or renaming an entry changes the
+	  directory's mtime, so a matching key means the filtered names are still valid.
+	- Content match results per pattern, search directory and file, keyed by the file's
+	  path relative to the search directory, mtime, size and inode, so a repeat scan only
+	  reads files that changed. Only the max_patterns most recently used pattern and
+	  directory pairs are kept.
+
+	The cache file is read when the cache is created and written back by save().
+	"""
+
+	VERSION = 3
+
+	def __init__(self, path: str, max_patterns: int = 16):
+		"""
+		Args:
+			path (str): Path of the cache file. A missing or unreadable file starts an empty cache.
+			max_patterns (int): Number of pattern and search directory pairs to keep content
+				match results for.
+		"""
+		self.path = path
+		self.max_patterns = max_patterns
+		self.directories: Dict[str, Tuple] = {}
+		self.patterns: OrderedDict = OrderedDict()
+		self.load()
+
+	def load(self):
+		"""Reads the cache file, keeping the cache empty if it is missing or unusable."""
+		try:
+			with open(self.path, 'rb') as f:
+				data = pickle.load(f)
+		except FileNotFoundError:
+			return
+		except Exception as e:
+			print(f"Warning: ignoring unreadable cache {self.path}: {e}")
+			return
+
+		if isinstance(data, dict) and data.get('version') == self.VERSION:
+			self.directories = data['directories']
+			self.patterns = data['patterns']
+
+	def save(self):
+		"""Writes the cache file, through a temporary file so readers never see a partial one."""
+		data = {'version': self.VERSION, 'directories': self.directories, 'patterns': self.patterns}
+		temp_path = self.path + '.tmp'
+		with open(temp_path, 'wb') as f:
+			pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(temp_path, self.path)
+
+	def filtered_names(self, dirpath: str, spec_key: Tuple) -> Optional[Tuple[List[str], List[str]]]:
+		"""Returns the cached (dirnames, fnames) kept by the spec in dirpath, or None."""
+		key = os.path.abspath(dirpath)
+		entry = self.directories.get(key)
+		if entry is None:
+			return None
+		try:
+			st = os.stat(dirpath)
+		except OSError:
+			return None
+		if entry[0] != (st.st_mtime_ns, st.st_ino, spec_key):
+			return None
+		return entry[1], entry[2]
+
+	def store_filtered_names(self, dirpath: str, spec_key: Tuple, dirnames: List[str], fnames: List[str]):
+		"""Caches the (dirnames, fnames) kept by the spec in dirpath."""
+		try:
+			st = os.stat(dirpath)
+		except OSError:
+			return
+		if _is_settled(st.st_mtime_ns):
+			self.directories[os.path.abspath(dirpath)] = ((st.st_mtime_ns, st.st_ino, spec_key), list(dirnames), list(fnames))
+
+	def pattern_entries(self, pattern_key: Tuple) -> Dict[str, Tuple]:
+		"""
+		Returns the per-file results for a pattern, marking it as the most recently used and
+		evicting the least recently used patterns beyond max_patterns.
+
+		The dict maps file paths relative to the search directory to ((mtime_ns, size,
+		inode), number of matches, Counter of matches). Workers read and add entries for different files concurrently,
+		which single dict operations allow.
+		"""
+		if pattern_key in self.patterns:
+			self.patterns.move_to_end(pattern_key)
+		else:
+			self.patterns[pattern_key] = {}
+		while len(self.patterns) > self.max_patterns:
+			self.patterns.popitem(last=False)
+		return self.patterns[pattern_key]
+
+def _ignore_status(spec: pathspec.PathSpec, path: str) -> Optional[bool]:
+	"""
+	Returns True if the last pattern in spec that matches path ignores it, False if it
+	re-includes it (a '!' pattern) and None if no pattern matches.
+	"""
+	if hasattr(spec, 'check_file'):
+		return spec.check_file(path).include
+	# pathspec before 0.12 can only tell whether a path ends up ignored
+	return True if spec.match_file(path) else None
+
+def _is_ignored(specs: List[Tuple[str, pathspec.PathSpec]], relative_path: str) -> bool:
+	"""
+	Checks a path against the ignore specs that apply to its directory.
+
+	Args:
+		specs (List[Tuple[str, pathspec.PathSpec]]): (base, spec) pairs from the search
+			directory down, base being the relative path of the spec's directory with a
+			trailing separator, '' for the search directory. A deeper spec that matches the
+			path decides over the ones above it, as with nested .gitignore files in git.
+		relative_path (str): Path relative to the search directory, with a trailing
+			separator for directories.
+
+	Returns:
+		bool: True if the path is ignored.
+	"""
+	for base, spec in reversed(specs):
+		status = _ignore_status(spec, relative_path[len(base):])
+		if status is not None:
+			return status
+	return False
+
+def _read_nested_gitignore(path: str) -> Optional[pathspec.PathSpec]:
+	"""Loads a .gitignore found during a walk, None if there is none or it can't be read."""
+	try:
+		with open(path, 'r') as f:
+			return pathspec.PathSpec.from_lines('gitwildmatch', f)
+	except OSError:
+		return None
+
+def _scan_directory(dirpath: str, prefix: str, specs: List[Tuple[str, pathspec.PathSpec]], recursive: bool) -> Tuple[List[str], List[str]]:
+	"""
+	Lists one directory with os.scandir and applies the ignore specs to it.
+
+	File types come from the DirEntry objects, which on most platforms needs no extra stat
+	call. Symbolic links to directories are listed neither as files nor as directories to
+	enter, as with os.walk.
+
+	Returns:
+		Tuple[List[str], List[str]]: The names of the subdirectories to enter (empty unless
+		recursive) and of the files, both without the ignored ones and in listing order.
+	"""
+	dirnames: List[str] = []
+	fnames: List[str] = []
+	with os.scandir(dirpath) as entries:
+		for entry in entries:
+			if entry.is_dir():
+				if recursive and not entry.is_symlink() and not (specs and _is_ignored(specs, prefix + entry.name + os.sep)):
+					dirnames.append(entry.name)
+			elif (recursive or entry.is_file()) and not (specs and _is_ignored(specs, prefix + entry.name)):
+				fnames.append(entry.name)
+	return dirnames, fnames
+
+def walk_directories(directory: str, recursive: bool = True, spec: Optional[pathspec.PathSpec] = None, nested_gitignore: bool = False, cache: Optional[ScanCache] = None) -> Iterator[Tuple[str, str, List[str]]]:
+	"""
+	Walks a directory tree with os.scandir, yielding each directory as soon as it is read.
+
+	Directories are visited top-down in the same order as os.walk. Ignored directories are
+	pruned before they are entered, so nothing below them is listed or matched. Unreadable
+	subdirectories are skipped.
+
+	Args:
+		directory (str): Path to the directory to walk.
+		recursive (bool): If False, only the directory itself is listed and only regular
+			files are yielded.
+		spec (pathspec.PathSpec, optional): Ignore patterns relative to the search directory.
+		nested_gitignore (bool): If True, a .gitignore file in a directory applies to that
+			directory and everything below it, overriding the patterns from above. The
+			search directory's own .gitignore is read too, unless spec is given.
+		cache (ScanCache, optional): Cache of filtered listings for a recursive walk.
+
+	Yields:
+		Tuple[str, str, List[str]]: The directory path, joined onto directory like os.walk
+		does, its path relative to the search directory ('' for the top) and the names of
+		the files in it that are not ignored.
+
+	Raises:
+		OSError: If the search directory itself can't be read.
+	"""
+	root_specs: List[Tuple[str, pathspec.PathSpec]] = [('', spec)] if spec else []
+	root_key: Tuple = (('', _spec_key(spec)),) if spec else ()
+	# (dirpath, relative dirpath, specs, fingerprint of the specs), the next directory last
+	stack = [(directory, '', root_specs, root_key)]
+	is_top = True
+	while stack:
+		dirpath, relative_dirpath, specs, specs_key = stack.pop()
+		prefix = relative_dirpath + os.sep if relative_dirpath else ''
+
+		if nested_gitignore and not (is_top and spec):
+			nested = _read_nested_gitignore(os.path.join(dirpath, '.gitignore'))
+			if nested:
+				specs = specs + [(prefix, nested)]
+				specs_key = specs_key + ((prefix, _spec_key(nested)),)
+
+		listing = None
+		use_cache = cache is not None and recursive and bool(specs)
+		if use_cache:
+			listing = cache.filtered_names(dirpath, specs_key)
+		if listing is None:
+			try:
+				listing = _scan_directory(dirpath, prefix, specs, recursive)
+			except OSError:
+				if is_top:
+					raise
+				continue
+			if use_cache:
+				cache.store_filtered_names(dirpath, specs_key, *listing)
+		is_top = False
+
+		dirnames, fnames = listing
+		yield dirpath, relative_dirpath, fnames
+
+		for dirname in reversed(dirnames):
+			stack.append((os.path.join(dirpath, dirname), prefix + dirname, specs, specs_key))
+
+def iter_matching_filenames(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None, cache: Optional[ScanCache] = None, nested_gitignore: bool = False) -> Iterator[str]:
+	"""
+	Yields filenames in the given directory that match the provided regex pattern, as the
+	walk finds them.
+
+	Args:
+		directory (str): Path to the directory.
+		pattern (str): Regular expression pattern to match filenames.
+		recursive (bool): If True, search recursively in subdirectories.
+		spec (pathspec.PathSpec, optional): A pathspec object for ignoring files.
+		cache (ScanCache, optional): Cache for the gitignore filtering of a recursive search.
+		nested_gitignore (bool): If True, also apply .gitignore files found in the walk.
+
+	Yields:
+		str: Matching filenames, relative to the directory.
+	"""
+	regex: Pattern = re.compile(pattern)
+	try:
+		for dirpath, relative_dirpath, fnames in walk_directories(directory, recursive, spec, nested_gitignore, cache):
+			prefix = relative_dirpath + os.sep if relative_dirpath else ''
+			for fname in fnames:
+				if regex.match(fname):
+					yield prefix + fname
+	except OSError as e:
+		print(f"Error reading directory: {e}")
+
+def get_matching_filenames(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None, cache: Optional[ScanCache] = None, nested_gitignore: bool = False) -> List[str]:
 	"""
 	Finds filenames in the given directory that match the provided regex pattern.
 
@@ -25,125 +302,281 @@ def get_matching_filenames(directory: str, pattern: str, recursive: bool = False
 		pattern (str): Regular expression pattern to match filenames.
 		recursive (bool): If True, search recursively in subdirectories.
 		spec (pathspec.PathSpec, optional): A pathspec object for ignoring files.
+		cache (ScanCache, optional): Cache for the gitignore filtering of a recursive search.
+		nested_gitignore (bool): If True, also apply .gitignore files found in the walk.
 
 	Returns:
 		List[str]: A list of matching filenames.
 	"""
-	regex: Pattern = re.compile(pattern)
-	matching_files: List[str] = []
-	if recursive:
-		for dirpath, dirnames, fnames in os.walk(directory, topdown=True):
-			if spec:
-				# Get paths relative to the search directory for spec matching
-				relative_dirpath = os.path.relpath(dirpath, directory)
-				if relative_dirpath == '.':
-					relative_dirpath = ''
-
-				# Filter directories in-place
-				original_dirnames = list(dirnames)
-				dirnames[:] = [d for d in original_dirnames if not spec.match_file(os.path.join(relative_dirpath, d, ''))]
-
-				# Filter files
-				fnames = [f for f in fnames if not spec.match_file(os.path.join(relative_dirpath, f))]
+	return list(iter_matching_filenames(directory, pattern, recursive, spec, cache, nested_gitignore))
 
-			for fname in fnames:
-				if regex.match(fname):
-					full_path = os.path.join(dirpath, fname)
-					relative_path = os.path.relpath(full_path, directory)
-					matching_files.append(relative_path)
-		return matching_files
+def _search_file(filepath: str, regex: Pattern, match_counts: Optional[Counter] = None) -> int:
+	"""
+	Finds the content matches in one file, decoded as UTF-8 text.
+
+	Args:
+		filepath (str): Path to the file.
+		regex (Pattern): Compiled str pattern to match in content.
+		match_counts (Counter, optional): If given, each match, extended to include the
+			alphanumeric and underscore characters that follow it, is counted in it.
 
+	Returns:
+		int: The number of matches, 0 if the file can't be read.
+	"""
 	try:
-		filenames = os.listdir(directory)
-	except OSError as e:
-		print(f"Error reading directory: {e}")
-		return []
+		with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+			content = f.read()
+	except Exception:
+		# Skip files that can't be read (e.g., binary files, permission errors)
+		return 0
+
+	if match_counts is None:
+		return sum(1 for _ in regex.finditer(content))
 
-	if spec:
-		filenames = [f for f in filenames if not spec.match_file(f)]
+	num_matches = 0
+	for match in regex.finditer(content):
+		num_matches += 1
+		# Extend the match over the word characters that follow it in one step
+		end_pos = WORD_TAIL.match(content, match.end()).end()
+		match_counts[content[match.start():end_pos]] += 1
 
-	matching_files = [fname for fname in filenames if regex.match(fname) and os.path.isfile(os.path.join(directory, fname))]
-	return matching_files
+	return num_matches
 
-def count_content_matches(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None) -> Tuple[int, List[str], List[str]]:
+def _is_binary(f: BinaryIO) -> bool:
+	"""Treats a file as binary if its first block contains a NUL byte, like git does."""
+	return b'\0' in f.read(BINARY_SNIFF_BYTES)
+
+def _search_file_mmap(filepath: str, regex: Pattern, match_counts: Optional[Counter] = None) -> int:
 	"""
-	Counts regex matches in file contents and lists files with matches.
+	Finds the content matches in one file by matching a bytes pattern against a
+	read-only memory map of it, so the file is never copied into memory.
+
+	Binary files are skipped after sniffing their first block. Matches are extended over
+	the ASCII alphanumeric and underscore bytes that follow them and counted as bytes;
+	_search_batch decodes each distinct match once.
 
 	Args:
-		directory (str): Path to the directory to search.
-		pattern (str): Regular expression pattern to match in content.
-		recursive (bool): If True, search recursively in subdirectories.
-		spec (pathspec.PathSpec, optional): A pathspec object for ignoring files.
+		filepath (str): Path to the file.
+		regex (Pattern): Compiled bytes pattern to match in content.
+		match_counts (Counter, optional): If given, each extended match is counted in it.
 
 	Returns:
-		Tuple[int, List[str], List[str]]: A tuple containing the total number of matches,
-		a list of filenames with at least one match, and a list of all matches.
+		int: The number of matches, 0 for binary, empty or unreadable files.
 	"""
-	regex: Pattern = re.compile(pattern)
+	try:
+		with open(filepath, 'rb') as f:
+			if _is_binary(f) or os.fstat(f.fileno()).st_size == 0:
+				return 0
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+				if hasattr(mmap, 'MADV_SEQUENTIAL'):
+					content.madvise(mmap.MADV_SEQUENTIAL)
+
+				if match_counts is None:
+					return sum(1 for _ in regex.finditer(content))
+
+				num_matches = 0
+				for match in regex.finditer(content):
+					num_matches += 1
+					end_pos = WORD_TAIL_BYTES.match(content, match.end()).end()
+					match_counts[content[match.start():end_pos]] += 1
+				return num_matches
+	except (OSError, ValueError):
+		# Skip files that can't be read or mapped
+		return 0
+
+def _search_batch(files: List[Tuple[str, str]], regex: Pattern, use_mmap: bool = False, collect_matches: bool = True, file_entries: Optional[Dict[str, Tuple]] = None) -> Tuple[int, List[str], Counter]:
+	"""
+	Searches a batch of files, the unit of work for one worker.
+
+	Args:
+		files (List[Tuple[str, str]]): (path, path relative to the search directory) of the
+			files to search, in output order. Files with matches are reported by the
+			relative path.
+		regex (Pattern): Compiled pattern to match in content, bytes if use_mmap is True.
+		use_mmap (bool): If True, search memory-mapped files with _search_file_mmap.
+		collect_matches (bool): If False, only count the matches.
+		file_entries (Dict[str, Tuple], optional): Cached results for this pattern, see
+			ScanCache.pattern_entries. Unchanged files are not read, the others are
+			searched with their matches collected and stored.
+
+	Returns:
+		Tuple[int, List[str], Counter]: The number of matches, the files with at least
+		one match and the count of each distinct match, for this batch alone.
+	"""
+	search_file = _search_file_mmap if use_mmap else _search_file
 	total_matches = 0
 	files_with_matches: List[str] = []
-	all_matches: List[str] = []
+	match_counts: Optional[Counter] = Counter() if collect_matches else None
+	for filepath, relative_path in files:
+		if file_entries is None:
+			num_matches = search_file(filepath, regex, match_counts)
+		else:
+			num_matches = _search_file_cached(filepath, relative_path, regex, search_file, file_entries, match_counts)
+		if num_matches:
+			files_with_matches.append(relative_path)
+			total_matches += num_matches
+
+	if match_counts is None:
+		return total_matches, files_with_matches, Counter()
+	if use_mmap:
+		# Distinct byte strings can decode to the same text once invalid bytes are dropped
+		decoded: Counter = Counter()
+		for match, count in match_counts.items():
+			decoded[match.decode('utf-8', errors='ignore')] += count
+		match_counts = decoded
+	return total_matches, files_with_matches, match_counts
+
+def _search_file_cached(filepath: str, key: str, regex: Pattern, search_file: Any, file_entries: Dict[str, Tuple], match_counts: Optional[Counter]) -> int:
+	"""
+	Searches one file through the cache: if its mtime, size and inode match the cached
+	entry under key, its path relative to the search directory, the cached result is
+	used, otherwise the file is searched and the entry replaced.
 
-	files_to_search = []
-	if recursive:
-		for dirpath, dirnames, fnames in os.walk(directory, topdown=True):
-			if spec:
-				relative_dirpath = os.path.relpath(dirpath, directory)
-				if relative_dirpath == '.':
-					relative_dirpath = ''
+	Returns:
+		int: The number of matches, 0 if the file can't be read.
+	"""
+	try:
+		st = os.stat(filepath)
+	except OSError:
+		return 0
+
+	stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+	entry = file_entries.get(key)
+	if entry is not None and entry[0] == stamp:
+		num_matches, file_counts = entry[1], entry[2]
+	else:
+		file_counts = Counter()
+		num_matches = search_file(filepath, regex, file_counts)
+		if _is_settled(st.st_mtime_ns):
+			file_entries[key] = (stamp, num_matches, file_counts)
+		else:
+			file_entries.pop(key, None)
 
-				original_dirnames = list(dirnames)
-				dirnames[:] = [d for d in original_dirnames if not spec.match_file(os.path.join(relative_dirpath, d, ''))]
+	if match_counts is not None:
+		match_counts.update(file_counts)
+	return num_matches
 
-				fnames = [f for f in fnames if not spec.match_file(os.path.join(relative_dirpath, f))]
+def _content_file_batches(directory: str, recursive: bool, spec: Optional[pathspec.PathSpec], batch_size: int, cache: Optional[ScanCache] = None, nested_gitignore: bool = False) -> Iterator[List[Tuple[str, str]]]:
+	"""
+	Yields (path, relative path) of the files to search in walk order, at most batch_size
+	at a time. Both paths are built by prefixing the name with its directory's.
 
-			for fname in fnames:
-				files_to_search.append(os.path.join(dirpath, fname))
-	else:
-		try:
-			filenames = os.listdir(directory)
-			if spec:
-				filenames = [f for f in filenames if not spec.match_file(f)]
-
-			for fname in filenames:
-				full_path = os.path.join(directory, fname)
-				if os.path.isfile(full_path):
-					files_to_search.append(full_path)
-		except OSError as e:
-			print(f"Error reading directory: {e}")
-			return 0, [], []
-
-	for filepath in files_to_search:
-		try:
-			with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-				content = f.read()
+	Batches never span directories, so a worker reads files that sit next to each other.
+	Raises OSError if the search directory can't be read.
+	"""
+	for dirpath, relative_dirpath, fnames in walk_directories(directory, recursive, spec, nested_gitignore, cache):
+		dir_prefix = os.path.join(dirpath, '')
+		prefix = relative_dirpath + os.sep if relative_dirpath else ''
+		files = [(dir_prefix + fname, prefix + fname) for fname in fnames]
+		for start in range(0, len(files), batch_size):
+			yield files[start:start + batch_size]
+
+def iter_content_matches(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None, jobs: int = 1, use_mmap: bool = False, collect_matches: bool = True, cache: Optional[ScanCache] = None, nested_gitignore: bool = False) -> Iterator[Tuple[int, List[str], Counter]]:
+	"""
+	Searches file contents like count_content_matches, yielding the results of each batch
+	of files in walk order as soon as it is done, so output can start before the walk ends.
 
-				# Use finditer to get match objects with positions
-				file_has_match = False
-				for match in regex.finditer(content):
-					if not file_has_match:
-						relative_path = os.path.relpath(filepath, directory)
-						files_with_matches.append(relative_path)
-						file_has_match = True
+	With jobs > 1 at most PENDING_BATCHES_PER_JOB batches per thread are in flight, which
+	bounds the memory held by results that are waiting for an earlier batch.
 
-					total_matches += 1
+	Yields:
+		Tuple[int, List[str], Counter]: The number of matches, the files with at least one
+		match and the count of each distinct match, for one batch.
+	"""
+	regex: Pattern = re.compile(pattern.encode('utf-8') if use_mmap else pattern)
+	file_entries: Optional[Dict[str, Tuple]] = None
+	searched_paths: set = set()
+	batches = _content_file_batches(directory, recursive, spec, CONTENT_BATCH_SIZE, cache, nested_gitignore)
+	if cache is not None:
+		file_entries = cache.pattern_entries((pattern, use_mmap, os.path.abspath(directory)))
+		batches = _recording_batches(batches, searched_paths)
+	try:
+		if jobs <= 1:
+			for batch in batches:
+				yield _search_batch(batch, regex, use_mmap, collect_matches, file_entries)
+		else:
+			with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+				pending: deque = deque()
+				for batch in batches:
+					pending.append(executor.submit(_search_batch, batch, regex, use_mmap, collect_matches, file_entries))
+					if len(pending) >= jobs * PENDING_BATCHES_PER_JOB:
+						yield pending.popleft().result()
+				while pending:
+					yield pending.popleft().result()
+	except OSError as e:
+		print(f"Error reading directory: {e}")
+		return
+
+	if file_entries is not None:
+		_drop_unsearched_entries(file_entries, recursive, searched_paths)
+
+def count_content_matches(directory: str, pattern: str, recursive: bool = False, spec: Optional[pathspec.PathSpec] = None, jobs: int = 1, use_mmap: bool = False, collect_matches: bool = True, cache: Optional[ScanCache] = None, nested_gitignore: bool = False) -> Tuple[int, List[str], Counter]:
+	"""
+	Counts regex matches in file contents and lists files with matches.
+
+	Each match is extended to include the alphanumeric and underscore characters that
+	follow it and counted per distinct match, so memory grows with the number of
+	distinct matches rather than the total.
+
+	With jobs > 1 the files are read and searched by a pool of worker threads while the
+	directory walk goes on in the calling thread. Each batch of files is searched by one
+	worker and the per-batch results are merged in walk order, so the output is the same
+	as for jobs=1.
+
+	With use_mmap the pattern is compiled as a UTF-8 bytes pattern and matched against
+	memory-mapped files, which keeps memory use flat however large the files are. In
+	that mode binary files are skipped, and \\w, character classes and the match
+	extension only know ASCII.
 
-					# Extend the match to include following alphanumeric and underscore characters
-					original_match_str = match.group(0)
-					end_pos = match.end()
+	With a cache, files whose mtime, size and inode are unchanged since an earlier scan
+	for the same pattern and mode are not read again. Call cache.save() to keep the
+	results for the next run.
+
+	The files come from walk_directories, see there for nested_gitignore.
+
+	Args:
+		directory (str): Path to the directory to search.
+		pattern (str): Regular expression pattern to match in content.
+		recursive (bool): If True, search recursively in subdirectories.
+		spec (pathspec.PathSpec, optional): A pathspec object for ignoring files.
+		jobs (int): Number of worker threads, 1 searches in the calling thread.
+		use_mmap (bool): If True, match a bytes pattern against memory-mapped files.
+		collect_matches (bool): If False, matches are only counted and the returned
+			Counter is empty.
+		cache (ScanCache, optional): Cache of directory filtering and per-file results.
+		nested_gitignore (bool): If True, also apply .gitignore files found in the walk.
 
-					extended_match = original_match_str
-					while end_pos < len(content) and (content[end_pos].isalnum() or content[end_pos] == '_'):
-						extended_match += content[end_pos]
-						end_pos += 1
+	Returns:
+		Tuple[int, List[str], Counter]: A tuple containing the total number of matches,
+		a list of filenames with at least one match, and the number of times each
+		distinct match was found, in order of first appearance.
+	"""
+	total_matches = 0
+	files_with_matches: List[str] = []
+	match_counts: Counter = Counter()
+	for batch_matches, batch_files, batch_counts in iter_content_matches(directory, pattern, recursive, spec, jobs, use_mmap, collect_matches, cache, nested_gitignore):
+		total_matches += batch_matches
+		files_with_matches.extend(batch_files)
+		match_counts.update(batch_counts)
 
-					all_matches.append(extended_match)
+	return total_matches, files_with_matches, match_counts
 
-		except Exception:
-			# Skip files that can't be read (e.g., binary files, permission errors)
-			pass
+def _recording_batches(batches: Iterator[List[Tuple[str, str]]], searched_paths: set) -> Iterator[List[Tuple[str, str]]]:
+	"""Passes batches through, adding the relative path of every file to searched_paths."""
+	for batch in batches:
+		searched_paths.update(relative_path for _, relative_path in batch)
+		yield batch
 
-	return total_matches, files_with_matches, all_matches
+def _drop_unsearched_entries(file_entries: Dict[str, Tuple], recursive: bool, searched_paths: set):
+	"""
+	Removes cached results for files in the searched area that the search did not visit,
+	because they were deleted or are now ignored. A search that is not recursive only
+	covers the files directly in the search directory.
+	"""
+	for key in list(file_entries):
+		in_scope = recursive or os.sep not in key
+		if in_scope and key not in searched_paths:
+			del file_entries[key]
 
 def main():
 	parser = argparse.ArgumentParser(description="Count or list filenames or content matches for a regex in a directory.")
@@ -153,40 +586,68 @@ def main():
 	parser.add_argument("-r", "--recursive", action="store_true", help="Recursively search in child directories")
 	parser.add_argument("-c", "--content", action="store_true", help="Search file contents instead of filenames")
 	parser.add_argument("-u", "--unique", action="store_true", help="Count or list unique content matches. Requires -c.")
+	parser.add_argument("-t", "--top", type=int, metavar="K", help="List the K most frequent content matches with their counts. Requires -c.")
 	parser.add_argument("-g", "--use-gitignore", action="store_true", help="Use .gitignore file to filter results. When --gitignore-path is not passed, defaults to .gitignore in the search directory.")
 	parser.add_argument("--gitignore-path", default=".gitignore", help="Supply a path to .gitignore, relative to the search directory. Requires -g.")
+	parser.add_argument("--nested-gitignore", action="store_true", help="Also apply the .gitignore file of every directory in the search to that directory and below, as git does.")
+	parser.add_argument("-m", "--mmap", action="store_true", help="Match a bytes regex against memory-mapped files with -c. Skips binary files; \\w, character classes and match extension are ASCII-only.")
+	parser.add_argument("--cache", metavar="PATH", help="Cache file for repeat scans. Gitignore filtering per directory and content matches per file are reused while unchanged.")
+	parser.add_argument("--cache-patterns", type=int, default=16, metavar="N", help="Number of content patterns to keep in the cache, per search directory, least recently used first out. Requires --cache.")
+	parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of threads reading and searching files with -c. 0 uses one per CPU. Output order does not depend on it.")
 	args = parser.parse_args()
 
 	if args.unique and not args.content:
 		parser.error("-u/--unique requires -c/--content.")
 
+	if args.top is not None and not args.content:
+		parser.error("-t/--top requires -c/--content.")
+	if args.top is not None and args.top < 1:
+		parser.error("-t/--top must be 1 or more.")
+
+	if args.jobs < 0:
+		parser.error("-j/--jobs must be 0 or more.")
+	jobs = args.jobs or os.cpu_count() or 1
+
+	if args.cache_patterns < 1:
+		parser.error("--cache-patterns must be 1 or more.")
+	cache = ScanCache(args.cache, args.cache_patterns) if args.cache else None
+
 	spec = None
 	if args.use_gitignore:
 		spec = load_gitignore_spec(args.directory, args.gitignore_path)
 
-	if args.content:
-		total_matches, files_with_matches, all_matches = count_content_matches(args.directory, args.pattern, args.recursive, spec)
-		if args.unique:
-			unique_matches = sorted(list(set(all_matches)))
+	if args.content and args.list and not args.unique and args.top is None:
+		# Stream the files with matches as each batch finishes
+		for _, batch_files, _ in iter_content_matches(args.directory, args.pattern, args.recursive, spec, jobs, args.mmap, False, cache, args.nested_gitignore):
+			for fname in batch_files:
+				print(fname)
+	elif args.content:
+		collect_matches = args.unique or args.top is not None
+		total_matches, files_with_matches, match_counts = count_content_matches(args.directory, args.pattern, args.recursive, spec, jobs, args.mmap, collect_matches, cache, args.nested_gitignore)
+		if args.top is not None:
+			# Ties keep the order in which the matches were first found
+			for match, count in match_counts.most_common(args.top):
+				print(f"{count}\t{match}")
+		elif args.unique:
+			unique_matches = sorted(match_counts)
 			if args.list:
 				for match in unique_matches:
 					print(match)
 			else:
 				print(f"Number of unique content matches: {len(unique_matches)}")
 		else:
-			if args.list:
-				for fname in files_with_matches:
-					print(fname)
-			else:
-				print(f"Number of content matches: {total_matches}")
+			print(f"Number of content matches: {total_matches}")
 	else:
-		matching_files = get_matching_filenames(args.directory, args.pattern, args.recursive, spec)
+		matching_files = iter_matching_filenames(args.directory, args.pattern, args.recursive, spec, cache, args.nested_gitignore)
 
 		if args.list:
 			for fname in matching_files:
 				print(fname)
 		else:
-			print(f"Number of matching files: {len(matching_files)}")
+			print(f"Number of matching files: {sum(1 for _ in matching_files)}")
+
+	if cache is not None:
+		cache.save()
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,82 @@
+import os
+import random
+import argparse
+import tempfile
+import time
+from typing import List
+
+import filestats
+
+WORDS = ["alpha", "beta", "gamma", "delta", "func_", "var_", "class", "return", "import", "value"]
+
+def make_tree(root: str, num_dirs: int, files_per_dir: int, file_kb: int, seed: int = 1) -> int:
+	"""
+	Writes a synthetic source tree of random words for benchmarking.
+
+	Args:
+		root (str): Directory to create the tree in.
+		num_dirs (int): Number of directories, nested up to three levels deep.
+		files_per_dir (int): Number of files per directory.
+		file_kb (int): Approximate size of each file in kilobytes.
+		seed (int): Seed for the word choices.
+
+	Returns:
+		int: The number of files written.
+	"""
+	rnd = random.Random(seed)
+	num_files = 0
+	for d in range(num_dirs):
+		dirpath = os.path.join(root, f"pkg{d % 8}", f"mod{d % 64}", f"dir{d}")
+		os.makedirs(dirpath, exist_ok=True)
+		for i in range(files_per_dir):
+			words: List[str] = []
+			size = 0
+			while size < file_kb * 1024:
+				word = rnd.choice(WORDS) + str(rnd.randrange(1000))
+				words.append(word)
+				size += len(word) + 1
+			with open(os.path.join(dirpath, f"file{i}.py"), 'w') as f:
+				f.write(" ".join(words))
+			num_files += 1
+	return num_files
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark filestats content search with different --jobs values.")
+	parser.add_argument("--dirs", type=int, default=200, help="Directories in the synthetic tree")
+	parser.add_argument("--files", type=int, default=50, help="Files per directory")
+	parser.add_argument("--file-kb", type=int, default=8, help="Size of each file in kilobytes")
+	parser.add_argument("--jobs", nargs="+", type=int, default=[1, 2, 4, 8, 16], help="Values of --jobs to time")
+	parser.add_argument("--pattern", default=r"func_\d", help="Content pattern to search for")
+	parser.add_argument("--repeat", type=int, default=3, help="Runs per jobs value, the fastest is reported")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as root:
+		num_files = make_tree(root, args.dirs, args.files, args.file_kb)
+		print(f"Synthetic tree: {num_files} files, {num_files * args.file_kb / 1024:.1f} MiB, {os.cpu_count()} CPUs")
+		# The tree was just written, so it is in the page cache and the search is
+		# CPU-bound here. Threads gain the most when reads have to go to disk.
+
+		baseline_result = None
+		baseline_seconds = None
+		print("jobs    seconds   files/sec   speedup")
+		for jobs in args.jobs:
+			best = None
+			for _ in range(args.repeat):
+				start = time.perf_counter()
+				result = filestats.count_content_matches(root, args.pattern, recursive=True, jobs=jobs)
+				elapsed = time.perf_counter() - start
+				best = elapsed if best is None else min(best, elapsed)
+
+			if baseline_result is None:
+				baseline_result = result
+				baseline_seconds = best
+			elif result != baseline_result:
+				print(f"Error: results with --jobs {jobs} differ from --jobs {args.jobs[0]}")
+				return
+
+			print(f"{jobs:4d}  {best:9.3f}  {num_files / best:10.0f}  {baseline_seconds / best:7.2f}x")
+
+		print(f"Number of content matches: {baseline_result[0]}, identical for every --jobs value")
+
+if __name__ == "__main__":
+	main()
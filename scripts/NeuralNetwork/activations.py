@@ -0,0 +1,144 @@
+# activations.py
+# Python 3.x
+
+import numpy as np
+
+# Array-wide activation functions, the Python side of ActivationFunctions.gd.
+#
+# activate(x) maps weighted sums to activations and differentiate(a) gives
+# the derivative in terms of the activation, both over whole arrays. Pass
+# out=x to work in place. Row-wise functions (SoftMax) can also take a
+# (rows, 1) scratch buffer so they don't allocate for their reductions.
+#
+# Models look functions up by name with get(), case-insensitively, using
+# the names of the Activations.Type enum (TanH, ReLu, ...).
+
+
+class ActivationFunction:
+    def activate(self, x, out=None, scratch=None):
+        raise NotImplementedError
+
+    def differentiate(self, a, out=None):
+        raise NotImplementedError
+
+
+class Pass(ActivationFunction):
+    def activate(self, x, out=None, scratch=None):
+        if out is None:
+            return np.array(x)
+        if out is not x:
+            np.copyto(out, x)
+        return out
+
+    def differentiate(self, a, out=None):
+        if out is None:
+            return np.ones_like(a)
+        out.fill(1.0)
+        return out
+
+
+class TanH(ActivationFunction):
+    def activate(self, x, out=None, scratch=None):
+        return np.tanh(x, out=out)
+
+    def differentiate(self, a, out=None):
+        out = np.multiply(a, a, out=out)
+        return np.subtract(1.0, out, out=out)
+
+
+class Sigmoid(ActivationFunction):
+    def activate(self, x, out=None, scratch=None):
+        out = np.negative(x, out=out)
+        with np.errstate(over='ignore'):  # exp overflow just means 0
+            np.exp(out, out=out)
+        np.add(out, 1.0, out=out)
+        return np.reciprocal(out, out=out)
+
+    def differentiate(self, a, out=None):
+        out = np.subtract(1.0, a, out=out)
+        return np.multiply(out, a, out=out)
+
+
+class ReLu(ActivationFunction):
+    def activate(self, x, out=None, scratch=None):
+        return np.maximum(x, 0.0, out=out)
+
+    def differentiate(self, a, out=None):
+        if out is None:
+            out = np.empty_like(a)
+        return np.greater(a, 0.0, out=out)
+
+
+class PreLu(ActivationFunction):
+    def __init__(self, alpha=0.25):
+        self.alpha = alpha
+
+    def activate(self, x, out=None, scratch=None):
+        # max(alpha * x, x) for 0 <= alpha <= 1
+        if out is None:
+            out = np.empty_like(x)
+        if out is not x:
+            np.copyto(out, x)
+        np.multiply(out, self.alpha, out=out, where=out < 0.0)
+        return out
+
+    def differentiate(self, a, out=None):
+        if out is None:
+            out = np.empty_like(a)
+        np.greater(a, 0.0, out=out)
+        # 1 where a > 0, alpha elsewhere
+        np.multiply(out, 1.0 - self.alpha, out=out)
+        return np.add(out, self.alpha, out=out)
+
+
+class LeakyReLu(PreLu):
+    def __init__(self, alpha=0.01):
+        PreLu.__init__(self, alpha)
+
+
+class SoftMax(ActivationFunction):
+    # row-wise softmax over the last axis, the max of each row is
+    # subtracted first for stability
+    def activate(self, x, out=None, scratch=None):
+        if out is None:
+            out = np.empty_like(x)
+        scratch = np.max(x, axis=-1, keepdims=True, out=scratch)
+        np.subtract(x, scratch, out=out)
+        np.exp(out, out=out)
+        np.sum(out, axis=-1, keepdims=True, out=scratch)
+        return np.divide(out, scratch, out=out)
+
+    def differentiate(self, a, out=None):
+        # diagonal of the Jacobian only, as in ActivationFunctions.gd
+        out = np.subtract(1.0, a, out=out)
+        return np.multiply(out, a, out=out)
+
+
+_functions = {}
+
+
+def register(name, function):
+    _functions[name.lower()] = function
+
+
+def get(name):
+    try:
+        return _functions[name.lower()]
+    except KeyError:
+        raise ValueError("unknown activation '%s', expected one of %s" %
+                         (name, ", ".join(sorted(_functions)))) from None
+
+
+def names():
+    return sorted(_functions)
+
+
+register('Pass', Pass())
+register('TanH', TanH())
+register('Sigmoid', Sigmoid())
+register('ReLu', ReLu())
+register('LeakyReLu', LeakyReLu())
+register('PreLu', PreLu())
+register('SoftMax', SoftMax())
+
+# end script
@@ -0,0 +1,228 @@
+# benchmark.py
+# Python 3.x
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+import metrics
+import nn
+import nn2
+import nn3
+import layerstack
+import parallel
+
+# Training benchmark across the Python engines.
+#
+# Every (engine, width, rows, batch size) combination runs in a fresh
+# spawned process so peak RSS belongs to that trial alone. For each trial
+# we record wall time per epoch, samples/sec, peak RSS and the final mean
+# squared error on the training data, and the whole grid is written as
+# JSON so runs can be diffed for regressions.
+#
+# peakRssBytes is the trial process itself, peakChildRssBytes the largest
+# of its child processes (the parallel engine's pool workers, 0 for the
+# other engines), so the parallel engine's memory is not understated.
+
+NUM_FEATURES = 4
+NUM_CLASSES = 3
+LEARN_RATE = 0.01
+
+# -----
+# engine adapters: trainEpoch(trainData) runs one epoch,
+# forward(x) returns output rows for evaluation
+
+
+class NnEngine:
+    # nn.py, sigmoid MLP updated once per batch slice
+    def __init__(self, width, batchSize, seed):
+        np.random.seed(seed)
+        self.batchSize = batchSize
+        self.model = nn.NeuralNetwork(NUM_FEATURES, width, NUM_CLASSES, max_batch=batchSize)
+
+    def trainEpoch(self, trainData):
+        for start in range(0, len(trainData), self.batchSize):
+            batch = trainData[start:start+self.batchSize]
+            self.model.backpropagation(batch[:, :NUM_FEATURES], batch[:, NUM_FEATURES:], LEARN_RATE)
+
+    def forward(self, x):
+        return self.model.forward(x)
+
+
+class Nn2Engine:
+    # nn2.py, online only, batchSize is ignored
+    def __init__(self, width, batchSize, seed):
+        np.random.seed(seed)
+        self.model = nn2.NeuralNetwork(NUM_FEATURES, NUM_CLASSES, width, LEARN_RATE)
+
+    def trainEpoch(self, trainData):
+        for row in trainData:
+            self.model.train(row[:NUM_FEATURES], row[NUM_FEATURES:])
+
+    def forward(self, x):
+        return self.model.run_batch(x)
+
+
+class Nn3Engine:
+    def __init__(self, width, batchSize, seed):
+        self.batchSize = batchSize
+        self.model = nn3.NeuralNetwork(NUM_FEATURES, width, NUM_CLASSES, seed, maxBatch=batchSize)
+
+    def trainEpoch(self, trainData):
+        self.model.trainMiniBatch(trainData, 1, LEARN_RATE, self.batchSize)
+
+    def forward(self, x):
+        return self.model.computeOutputsBatch(x)[1]
+
+
+class LayerStackEngine(Nn3Engine):
+    def __init__(self, width, batchSize, seed):
+        self.batchSize = batchSize
+        self.model = layerstack.LayerStack([NUM_FEATURES, width, NUM_CLASSES],
+                                           ['tanh', 'softmax'], seed, maxBatch=batchSize)
+
+    def forward(self, x):
+        return self.model.computeOutputsBatch(x)
+
+
+class ParallelEngine(LayerStackEngine):
+    # LayerStack on parallel.DataParallelTrainer with one worker per core
+    trainer = None
+
+    def prepare(self, trainData):
+        # pool start-up and the shared memory copy are not timed
+        self.trainer = parallel.DataParallelTrainer(self.model, trainData)
+
+    def trainEpoch(self, trainData):
+        self.trainer.trainMiniBatch(1, LEARN_RATE, self.batchSize)
+
+    def close(self):
+        if self.trainer is not None:
+            self.trainer.close()
+
+
+ENGINES = {
+    'nn': NnEngine,
+    'nn2': Nn2Engine,
+    'nn3': Nn3Engine,
+    'layerstack': LayerStackEngine,
+    'parallel': ParallelEngine,
+}
+
+# -----
+
+
+def peakRss(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS. For
+    # RUSAGE_CHILDREN it is the largest child that has been waited for.
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def runTrial(config):
+    trainData = nn3.makeData(NUM_FEATURES, 5, NUM_CLASSES, config['rows'], nn_seed=1)
+    engine = ENGINES[config['engine']](config['width'], config['batchSize'], seed=13)
+    epochSeconds = []
+    try:
+        if hasattr(engine, 'prepare'):
+            engine.prepare(trainData)
+        for epoch in range(config['epochs']):
+            start = time.perf_counter()
+            engine.trainEpoch(trainData)
+            epochSeconds.append(time.perf_counter() - start)
+    finally:
+        # stops the parallel engine's pool and frees its shared memory,
+        # its workers then count in RUSAGE_CHILDREN
+        if hasattr(engine, 'close'):
+            engine.close()
+
+    result = metrics.evaluate(engine.forward, trainData[:, :NUM_FEATURES],
+                              trainData[:, NUM_FEATURES:])
+    totalSeconds = sum(epochSeconds)
+    return dict(config,
+                epochSeconds=epochSeconds,
+                meanEpochSeconds=totalSeconds / len(epochSeconds),
+                samplesPerSec=config['rows'] * len(epochSeconds) / totalSeconds,
+                peakRssBytes=peakRss(),
+                peakChildRssBytes=peakRss(resource.RUSAGE_CHILDREN),
+                finalLoss=result.meanSquaredError,
+                finalAccuracy=result.accuracy)
+
+
+def trialProcess(config, conn):
+    conn.send(runTrial(config))
+    conn.close()
+
+
+def runGrid(engines, widths, rows, batchSizes, epochs):
+    context = mp.get_context('spawn')
+    results = []
+    for (engine, width, numRows, batchSize) in itertools.product(engines, widths, rows, batchSizes):
+        config = dict(engine=engine, width=width, rows=numRows,
+                      batchSize=batchSize, epochs=epochs)
+        # a plain process rather than a pool worker, pool workers are
+        # daemonic and the parallel engine needs to start its own pool
+        (receiver, sender) = context.Pipe(duplex=False)
+        process = context.Process(target=trialProcess, args=(config, sender))
+        process.start()
+        # close the parent's end of the pipe, so recv() sees EOF if the
+        # trial process dies before it sends a result
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+        receiver.close()
+        process.join()
+        if result is None:
+            print("%-10s width %5d  rows %7d  batch %5d  failed, exit code %s" %
+                  (engine, width, numRows, batchSize, process.exitcode))
+            continue
+        print("%-10s width %5d  rows %7d  batch %5d  %10.0f samples/sec  "
+              "%8.4f s/epoch  %7.1f MiB  workers %7.1f MiB  loss %0.4f" %
+              (engine, width, numRows, batchSize, result['samplesPerSec'],
+               result['meanEpochSeconds'], result['peakRssBytes'] / 2**20,
+               result['peakChildRssBytes'] / 2**20, result['finalLoss']))
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training throughput of the Python engines.")
+    parser.add_argument("--engines", nargs="+", default=['nn', 'nn2', 'nn3', 'layerstack'],
+                        choices=sorted(ENGINES), help="Engines to run")
+    parser.add_argument("--widths", nargs="+", type=int, default=[8, 64, 256], help="Hidden layer widths")
+    parser.add_argument("--rows", nargs="+", type=int, default=[1000, 10000], help="Training set sizes")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 32, 256], help="Mini-batch sizes")
+    parser.add_argument("--epochs", type=int, default=3, help="Epochs per trial")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    results = runGrid(args.engines, args.widths, args.rows, args.batch_sizes, args.epochs)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpuCount': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Wrote " + str(len(results)) + " results to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
@@ -0,0 +1,301 @@
+# callbacks.py
+# Python 3.x
+
+import concurrent.futures
+import math
+
+import numpy as np
+
+# Training callbacks for the train loops of nn3, LayerStack, nn and
+# parallel.DataParallelTrainer.
+#
+# A train loop keeps one logs dict for the whole run and calls
+#   trainBegin(model, logs)   before the first epoch
+#   epochBegin(epoch, logs)   before every epoch, epoch counts from 0
+#   epochEnd(epoch, logs)     after every epoch, epoch is the number done
+#   trainEnd(logs)            after the last epoch
+# logs['learnRate'] is the learn rate the loop will use for the next
+# epoch, so a schedule changes it in epochBegin. Setting logs['stop']
+# ends training after the current epoch.
+#
+# checkpoint is imported where it is used: it imports the models, and the
+# models import this module.
+
+
+class Callback:
+    def trainBegin(self, model, logs):
+        self.model = model
+
+    def epochBegin(self, epoch, logs):
+        pass
+
+    def epochEnd(self, epoch, logs):
+        pass
+
+    def trainEnd(self, logs):
+        pass
+
+
+class CallbackList(Callback):
+    # runs callbacks in order, None or [] for no callbacks
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks or [])
+
+    def trainBegin(self, model, logs):
+        for callback in self.callbacks:
+            callback.trainBegin(model, logs)
+
+    def epochBegin(self, epoch, logs):
+        for callback in self.callbacks:
+            callback.epochBegin(epoch, logs)
+
+    def epochEnd(self, epoch, logs):
+        for callback in self.callbacks:
+            callback.epochEnd(epoch, logs)
+
+    def trainEnd(self, logs):
+        for callback in self.callbacks:
+            callback.trainEnd(logs)
+
+# -----
+
+
+class Checkpointer(Callback):
+    # saves a checkpoint every `every` epochs and once more at the end.
+    # The weights (and optimizer state) are copied into buffers owned by
+    # the checkpointer and written out by a background thread, so the
+    # train loop only pays for the copy. If the previous write has not
+    # finished yet the checkpoint is skipped instead of waiting for it.
+    # Put it after an EarlyStopping with restoreBest, so the final
+    # checkpoint holds the restored weights and is labelled with their
+    # epoch.
+    def __init__(self, path, every=1):
+        self.path = path
+        self.every = every
+        self.buffers = None
+        self.pending = None
+        self.lastEpoch = None
+        self.numWritten = 0
+        self.numSkipped = 0
+        self.executor = None
+
+    def trainBegin(self, model, logs):
+        # the writer thread lives for one training run, trainEnd stops it
+        Callback.trainBegin(self, model, logs)
+        self.lastEpoch = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def epochEnd(self, epoch, logs):
+        if epoch % self.every == 0:
+            self.submit(epoch)
+
+    def trainEnd(self, logs):
+        if logs.get('restoredBest'):
+            epoch = logs['bestEpoch']
+        else:
+            epoch = logs.get('epoch', 0)
+        try:
+            self.wait()
+            if epoch != self.lastEpoch:
+                self.submit(epoch)
+                self.wait()
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+
+    def submit(self, epoch):
+        import checkpoint
+
+        if self.pending is not None and not self.pending.done():
+            self.numSkipped += 1
+            return
+        self.wait()  # collect the previous result, raises write errors
+
+        (header, arrays) = checkpoint.describe(self.model, epoch)
+        if self.buffers is None or self.buffers.keys() != arrays.keys():
+            self.buffers = {name: np.empty_like(array) for (name, array) in arrays.items()}
+        for (name, array) in arrays.items():
+            np.copyto(self.buffers[name], array)
+        self.pending = self.executor.submit(checkpoint.write, self.path, header, self.buffers)
+        self.lastEpoch = epoch
+
+    def wait(self):
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+            self.numWritten += 1
+
+
+class EarlyStopping(Callback):
+    # stops when the validation error has not improved by more than
+    # minDelta for `patience` checks, one check every `every` epochs.
+    # metric is the name of a model method taking validationData (for
+    # nn3 and LayerStack 'meanSquaredError' or 'crossEntropyError') or a
+    # function of the model. With restoreBest the model ends up with the
+    # weights of the best check, and its optimizer with the state it had
+    # then, so training can resume from there.
+    def __init__(self, validationData, patience=10, minDelta=0.0, every=1,
+                 metric='meanSquaredError', restoreBest=True):
+        self.validationData = validationData
+        self.patience = patience
+        self.minDelta = minDelta
+        self.every = every
+        self.metric = metric
+        self.restoreBest = restoreBest
+        self.best = None
+
+    def trainBegin(self, model, logs):
+        import checkpoint
+
+        Callback.trainBegin(self, model, logs)
+        self.bestError = math.inf
+        self.bestEpoch = 0
+        self.numBadChecks = 0
+        self.params = checkpoint.parameters(model)
+        if self.restoreBest:
+            self.best = {name: np.empty_like(array) for (name, array) in self.params.items()}
+        self.bestOptimizer = {}
+
+    def error(self):
+        if callable(self.metric):
+            return self.metric(self.model)
+        return getattr(self.model, self.metric)(self.validationData)
+
+    def epochEnd(self, epoch, logs):
+        if epoch % self.every != 0:
+            return
+        error = self.error()
+        logs['validationError'] = error
+        if error < self.bestError - self.minDelta:
+            self.bestError = error
+            self.bestEpoch = epoch
+            self.numBadChecks = 0
+            if self.restoreBest:
+                for (name, array) in self.params.items():
+                    np.copyto(self.best[name], array)
+                self.saveOptimizerState()
+        else:
+            self.numBadChecks += 1
+            if self.numBadChecks >= self.patience:
+                logs['stop'] = True
+
+    def trainEnd(self, logs):
+        # logs['restoredBest'] tells later callbacks the model now has the
+        # weights of epoch logs['bestEpoch']
+        restored = self.restoreBest and self.bestEpoch > 0
+        if restored:
+            for (name, array) in self.params.items():
+                np.copyto(array, self.best[name])
+            self.restoreOptimizerState()
+        logs['bestEpoch'] = self.bestEpoch
+        logs['restoredBest'] = restored
+
+    def saveOptimizerState(self):
+        # copies the optimizer's state (see Optimizer.state) into buffers
+        # kept from one best check to the next
+        optimizer = getattr(self.model, 'optimizer', None)
+        if optimizer is None:
+            return
+        for (name, value) in optimizer.state().items():
+            if isinstance(value, np.ndarray):
+                saved = self.bestOptimizer.get(name)
+                if saved is None or saved.shape != value.shape or saved.dtype != value.dtype:
+                    self.bestOptimizer[name] = value.copy()
+                else:
+                    np.copyto(saved, value)
+            elif value is not None:
+                self.bestOptimizer[name] = value
+
+    def restoreOptimizerState(self):
+        optimizer = getattr(self.model, 'optimizer', None)
+        if optimizer is None:
+            return
+        for (name, value) in self.bestOptimizer.items():
+            if isinstance(value, np.ndarray):
+                np.copyto(getattr(optimizer, name), value)
+            else:
+                setattr(optimizer, name, value)
+
+# -----
+# learn rate schedules, relative to the learn rate the loop started with
+
+
+class LearnRateSchedule(Callback):
+    def trainBegin(self, model, logs):
+        Callback.trainBegin(self, model, logs)
+        self.initialRate = logs['learnRate']
+
+    def epochBegin(self, epoch, logs):
+        logs['learnRate'] = self.rate(epoch)
+
+    def rate(self, epoch):
+        raise NotImplementedError
+
+
+class StepDecay(LearnRateSchedule):
+    # multiply by factor every `every` epochs
+    def __init__(self, factor=0.5, every=25):
+        self.factor = factor
+        self.every = every
+
+    def rate(self, epoch):
+        return self.initialRate * self.factor ** (epoch // self.every)
+
+
+class ExponentialDecay(LearnRateSchedule):
+    # multiply by decay every epoch
+    def __init__(self, decay=0.98):
+        self.decay = decay
+
+    def rate(self, epoch):
+        return self.initialRate * self.decay ** epoch
+
+
+class CosineDecay(LearnRateSchedule):
+    # half a cosine from the initial rate down to minRate over numEpochs
+    def __init__(self, numEpochs, minRate=0.0):
+        self.numEpochs = numEpochs
+        self.minRate = minRate
+
+    def rate(self, epoch):
+        progress = min(epoch, self.numEpochs) / self.numEpochs
+        return self.minRate + (self.initialRate - self.minRate) * 0.5 * (1.0 + math.cos(math.pi * progress))
+
+
+def main():
+    import os
+    import tempfile
+
+    import checkpoint
+    import nn3
+
+    print("\nBegin callbacks demo \n")
+
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+    (trainData, validationData) = nn3.splitData(trainData, trainPct=0.80)
+
+    path = os.path.join(tempfile.mkdtemp(), "nn3.ckpt")
+    saver = Checkpointer(path, every=5)
+    stopper = EarlyStopping(validationData, patience=10, every=5)
+    schedule = CosineDecay(numEpochs=500, minRate=0.001)
+
+    nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=16)
+    print("Starting training (mini-batch, up to 500 epochs)")
+    nn.trainMiniBatch(trainData, 500, 0.01, 16, callbacks=[schedule, stopper, saver])
+    print("Training complete")
+
+    print("\nBest validation ms error = %0.4f at epoch %d " % (stopper.bestError, stopper.bestEpoch))
+    print("Checkpoints written = " + str(saver.numWritten) +
+          ", skipped while a write was running = " + str(saver.numSkipped))
+    (restored, epoch, _) = checkpoint.load(path)
+    print("Last checkpoint is from epoch " + str(epoch))
+    print("Accuracy on test data = %0.4f " % restored.accuracy(testData))
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
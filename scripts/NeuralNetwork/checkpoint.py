@@ -0,0 +1,322 @@
+# checkpoint.py
+# Python 3.x
+
+import collections
+import json
+import os
+import struct
+
+import numpy as np
+
+import layerstack
+import nn
+import nn2
+import nn3
+import optimizers
+import precision
+
+# Versioned binary checkpoints for the Python models.
+#
+# Layout:
+#   0   magic          8 bytes, MAGIC
+#   8   version        uint32, little endian
+#   12  header length  uint32, bytes of JSON that follow
+#   16  header         UTF-8 JSON, zero padded up to a multiple of ALIGNMENT
+#   ..  arrays         raw C-order data, each starting on an ALIGNMENT
+#                      boundary, offsets relative to the end of the header
+#
+# The header records the model kind and its constructor settings (layer
+# sizes, activations, loss), the precision policy, the epoch counter, the
+# optimizer with its hyperparameters and scalar state, and the dtype,
+# shape and offset of every array. Arrays are the model parameters plus
+# the optimizer's state buffers.
+#
+# load() maps the parameter arrays with np.memmap and hands them to the
+# model as its weight buffer, so nothing is read until it is touched and
+# processes loading the same file share the page cache. With the default
+# mode='r' the weights are read-only, which is what inference wants; use
+# mode='c' to train on a private copy-on-write mapping, or 'r+' to write
+# updates back to the file.
+#
+# Parameters are written in the storage dtype of the model's precision
+# policy. When that is not the compute dtype (float16 storage for a
+# float32 model) load() converts them into memory instead of mapping.
+
+MAGIC = b'NNCKPT\x00\x00'
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sII')
+
+Checkpoint = collections.namedtuple('Checkpoint', ['model', 'epoch', 'header'])
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _activationName(function):
+    # registered names are the class names, see activations.register
+    return type(function).__name__
+
+# -----
+# per model kind: describe(model) -> (config, {name: array}) and
+# build(config, arrays, maxBatch, policy) -> model
+
+
+def _describeNn3(model):
+    config = dict(layerSizes=model.layerSizes, activations=model.activations, loss=model.loss)
+    return (config, {'weights': model.weights})
+
+
+def _buildNn3(config, arrays, maxBatch, policy):
+    (ni, nh, no) = config['layerSizes']
+    (hiddenActivation, outputActivation) = config['activations']
+    return nn3.NeuralNetwork(ni, nh, no, seed=0, maxBatch=maxBatch,
+                             hiddenActivation=hiddenActivation,
+                             outputActivation=outputActivation,
+                             loss=config['loss'], weights=arrays['weights'],
+                             precision=policy)
+
+
+def _describeLayerStack(model):
+    config = dict(layerSizes=model.layerSizes, activations=model.activations, loss=model.loss)
+    return (config, {'weights': model.weights})
+
+
+def _buildLayerStack(config, arrays, maxBatch, policy):
+    return layerstack.LayerStack(config['layerSizes'], config['activations'], seed=0,
+                                 maxBatch=maxBatch, loss=config['loss'],
+                                 weights=arrays['weights'], precision=policy)
+
+
+def _describeNn(model):
+    config = dict(layerSizes=[model.input_size, model.hidden_size, model.output_size],
+                  activations=[_activationName(model.activation)])
+    return (config, {'params': model.params})
+
+
+def _buildNn(config, arrays, maxBatch, policy):
+    (ni, nh, no) = config['layerSizes']
+    return nn.NeuralNetwork(ni, nh, no, max_batch=maxBatch,
+                            activation=config['activations'][0], params=arrays['params'],
+                            precision=policy)
+
+
+def _describeNn2(model):
+    config = dict(layerSizes=[model.no_of_in_nodes, model.no_of_hidden_nodes, model.no_of_out_nodes],
+                  activations=[_activationName(model.activation)],
+                  learningRate=model.learning_rate)
+    return (config, {'weights_in_hidden': model.weights_in_hidden,
+                     'weights_hidden_out': model.weights_hidden_out})
+
+
+def _buildNn2(config, arrays, maxBatch, policy):
+    # nn2 draws random weights in its constructor, they are replaced
+    (ni, nh, no) = config['layerSizes']
+    model = nn2.NeuralNetwork(ni, no, nh, config['learningRate'],
+                              activation=config['activations'][0], precision=policy)
+    model.weights_in_hidden = arrays['weights_in_hidden']
+    model.weights_hidden_out = arrays['weights_hidden_out']
+    return model
+
+
+_KINDS = {
+    'nn3': (nn3.NeuralNetwork, _describeNn3, _buildNn3),
+    'layerstack': (layerstack.LayerStack, _describeLayerStack, _buildLayerStack),
+    'nn': (nn.NeuralNetwork, _describeNn, _buildNn),
+    'nn2': (nn2.NeuralNetwork, _describeNn2, _buildNn2),
+}
+
+# -----
+
+
+def describe(model, epoch=0):
+    # (header, {name: array}) for model, the arrays are the model's own
+    # buffers, not copies
+    for (kind, (modelClass, describeKind, _)) in _KINDS.items():
+        if type(model) is modelClass:
+            break
+    else:
+        raise TypeError("cannot checkpoint a %s" % type(model).__name__)
+
+    (config, arrays) = describeKind(model)
+    paramNames = list(arrays)
+    policy = model.precision
+    header = dict(model=kind, config=config, epoch=epoch,
+                  dtype=policy.compute.name, precision=precision.toDict(policy),
+                  params=paramNames, optimizer=None, arrays={})
+
+    optimizer = getattr(model, 'optimizer', None)
+    if optimizer is not None:
+        scalars = {}
+        for (name, value) in optimizer.state().items():
+            if isinstance(value, np.ndarray):
+                arrays['optimizer.' + name] = value
+            else:
+                scalars[name] = value
+        header['optimizer'] = dict(name=type(optimizer).__name__,
+                                   config=optimizer.config(),
+                                   numParams=optimizer.numParams, scalars=scalars)
+    return (header, arrays)
+
+
+def parameters(model):
+    # {name: array} of the model's parameter buffers
+    (header, arrays) = describe(model)
+    return {name: arrays[name] for name in header['params']}
+
+
+def _fileDtype(header, name, array):
+    # parameters are written in the storage dtype of the policy, the
+    # optimizer state as it is
+    if name in header['params'] and 'precision' in header:
+        return np.dtype(header['precision']['storage'])
+    return array.dtype
+
+
+def write(path, header, arrays):
+    # written to a temporary file first and renamed, so readers never see
+    # a half written checkpoint. Parameters in another storage dtype are
+    # converted here, not in describe(), so the caller's arrays can stay
+    # the model's own buffers.
+    offset = 0
+    dtypes = {}
+    for (name, array) in arrays.items():
+        dtypes[name] = _fileDtype(header, name, array)
+        header['arrays'][name] = dict(dtype=dtypes[name].str, shape=list(array.shape),
+                                      offset=offset)
+        offset = _aligned(offset + array.size * dtypes[name].itemsize)
+
+    headerBytes = json.dumps(header).encode('utf-8')
+    dataStart = _aligned(_PREFIX.size + len(headerBytes))
+
+    tempPath = path + '.tmp'
+    with open(tempPath, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(headerBytes)))
+        f.write(headerBytes)
+        for (name, array) in arrays.items():
+            f.seek(dataStart + header['arrays'][name]['offset'])
+            np.ascontiguousarray(array, dtype=dtypes[name]).tofile(f)
+        f.truncate(dataStart + offset)
+    os.replace(tempPath, path)
+
+
+def save(path, model, epoch=0):
+    write(path, *describe(model, epoch))
+
+
+def readHeader(path):
+    # (header dict, offset of the array data)
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError("%s is not a checkpoint" % path)
+        (magic, version, headerLength) = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError("%s is not a checkpoint" % path)
+        if version > VERSION:
+            raise ValueError("%s is checkpoint version %d, this reader handles up to %d" %
+                             (path, version, VERSION))
+        header = json.loads(f.read(headerLength).decode('utf-8'))
+    return (header, _aligned(_PREFIX.size + headerLength))
+
+
+def load(path, mode='r', maxBatch=1):
+    # returns Checkpoint(model, epoch, header), see the notes at the top
+    # for mode
+    (header, dataStart) = readHeader(path)
+    if 'precision' in header:
+        policy = precision.fromDict(header['precision'])
+    else:
+        policy = precision.policy(header['dtype'])
+    arrays = {}
+    for (name, spec) in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        mapped = name in header['params'] and np.dtype(spec['dtype']) == policy.compute
+        if not all(shape):
+            arrays[name] = np.zeros(shape=shape, dtype=spec['dtype'])
+        elif mapped:
+            arrays[name] = np.memmap(path, dtype=spec['dtype'], mode=mode,
+                                     offset=dataStart + spec['offset'], shape=shape)
+        else:
+            # optimizer state is small next to what it is copied into,
+            # parameters stored in another dtype are converted
+            arrays[name] = np.fromfile(path, dtype=spec['dtype'], count=int(np.prod(shape)),
+                                       offset=dataStart + spec['offset']).reshape(shape)
+        if name in header['params']:
+            arrays[name] = arrays[name].astype(policy.compute, copy=False)
+
+    build = _KINDS[header['model']][2]
+    model = build(header['config'], arrays, maxBatch, policy)
+
+    saved = header['optimizer']
+    if saved is not None:
+        optimizer = optimizers.get(saved['name'], **saved['config'])
+        if saved['numParams']:
+            state = dict(saved['scalars'])
+            prefix = 'optimizer.'
+            for (name, array) in arrays.items():
+                if name.startswith(prefix):
+                    state[name[len(prefix):]] = array
+            optimizer.setState(saved['numParams'], state, np.dtype(header['dtype']))
+        model.optimizer = optimizer
+
+    return Checkpoint(model, header['epoch'], header)
+
+
+def main():
+    import tempfile
+    import time
+
+    print("\nBegin checkpoint demo \n")
+
+    directory = tempfile.mkdtemp()
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+
+    # resume training from a checkpoint, optimizer state included
+    path = os.path.join(directory, "nn3.ckpt")
+    nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=16, optimizer='Adam')
+    nn.trainMiniBatch(trainData, 10, 0.01, 16)
+    save(path, nn, epoch=10)
+    print("Saved " + path + " (" + str(os.path.getsize(path)) + " bytes)")
+
+    (resumed, epoch, _) = load(path, mode='c', maxBatch=16)
+    resumed.rnd.setstate(nn.rnd.getstate())
+    nn.trainMiniBatch(trainData, 10, 0.01, 16)
+    resumed.trainMiniBatch(trainData, 10, 0.01, 16)
+    print("Resumed from epoch " + str(epoch) + ", largest weight difference after " +
+          "10 more epochs = %0.2e " % np.abs(nn.weights - resumed.weights).max())
+    print("Accuracy on test data = %0.4f " % resumed.accuracy(testData))
+
+    # a large model, mapped rather than read
+    layerSizes = [1024, 4096, 4096, 16]
+    rng = np.random.default_rng(1)
+    numWts = sum(layerSizes[l] * layerSizes[l+1] + layerSizes[l+1]
+                 for l in range(len(layerSizes) - 1))
+    weights = rng.uniform(-0.01, 0.01, size=numWts).astype(np.float32)
+    big = layerstack.LayerStack(layerSizes, ['tanh', 'tanh', 'softmax'], seed=0,
+                                weights=weights)
+    path = os.path.join(directory, "big.ckpt")
+    start = time.perf_counter()
+    save(path, big)
+    saveSeconds = time.perf_counter() - start
+    print("\n" + "-".join(str(n) for n in layerSizes) + " network, " +
+          "%0.1f MiB checkpoint saved in %0.1f ms " %
+          (os.path.getsize(path) / 2**20, saveSeconds * 1000))
+
+    start = time.perf_counter()
+    (loaded, _, _) = load(path)
+    loadSeconds = time.perf_counter() - start
+    x = rng.uniform(-1.0, 1.0, size=(8, layerSizes[0])).astype(np.float32)
+    difference = np.abs(loaded.computeOutputsBatch(x) - big.computeOutputsBatch(x)).max()
+    print("Loaded in %0.2f ms, largest output difference = %0.2e " %
+          (loadSeconds * 1000, difference))
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
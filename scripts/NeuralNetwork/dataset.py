@@ -0,0 +1,136 @@
+# dataset.py
+# Python 3.x
+
+import os
+
+import numpy as np
+
+import nn3
+
+# Out-of-core datasets backed by a raw float32 file.
+#
+# Rows use the same layout as nn3.makeData: numFeatures input columns
+# followed by numClasses one-hot target columns. The file is opened with
+# np.memmap, so only the pages that are touched get read, and splits are
+# views on the same mapping.
+
+
+class MemmapDataset:
+
+    def __init__(self, path, numFeatures, numClasses, mode='r', numRows=None, rows=None):
+        self.path = path
+        self.numFeatures = numFeatures
+        self.numClasses = numClasses
+        numCols = numFeatures + numClasses
+
+        if rows is None:
+            if numRows is None:
+                rowBytes = numCols * np.dtype(np.float32).itemsize
+                numRows = os.path.getsize(path) // rowBytes
+            rows = np.memmap(path, dtype=np.float32, mode=mode,
+                             shape=(numRows, numCols))
+        self.rows = rows  # (numRows, numCols), a memmap or a view of one
+
+    @classmethod
+    def create(cls, path, numRows, numFeatures, numClasses):
+        # new zero filled file, writable
+        return cls(path, numFeatures, numClasses, mode='w+', numRows=numRows)
+
+    @classmethod
+    def fromArray(cls, path, data, numFeatures):
+        # write an in-memory matrix to path and map it back read-only
+        np.ascontiguousarray(data, dtype=np.float32).tofile(path)
+        return cls(path, numFeatures, data.shape[1] - numFeatures)
+
+    @classmethod
+    def generate(cls, path, numFeatures, numHidden, numClasses, numRows, seed,
+                 chunkSize=65536):
+        # synthetic nn3.makeData rows written chunk by chunk to path
+        data = cls.create(path, numRows, numFeatures, numClasses)
+        nn3.makeData(numFeatures, numHidden, numClasses, numRows, seed,
+                     out=data.rows, chunkSize=chunkSize)
+        data.flush()
+        return cls(path, numFeatures, numClasses)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def features(self):
+        return self.rows[:, :self.numFeatures]
+
+    @property
+    def targets(self):
+        return self.rows[:, self.numFeatures:]
+
+    def view(self, start, stop):
+        # rows [start, stop) without copying
+        return MemmapDataset(self.path, self.numFeatures, self.numClasses,
+                             rows=self.rows[start:stop])
+
+    def split(self, trainPct):
+        numTrainRows = int(len(self) * trainPct)
+        return (self.view(0, numTrainRows), self.view(numTrainRows, len(self)))
+
+    def flush(self):
+        if isinstance(self.rows, np.memmap):
+            self.rows.flush()
+
+    def batches(self, batchSize, seed=None, shuffle=True):
+        # yields (batchSize, numCols) float32 matrices in a fresh random
+        # order per call. Only the index vector and one batch buffer are
+        # held in memory; the yielded buffer is reused, so consume it
+        # before asking for the next batch.
+        numRows = len(self)
+        numCols = self.rows.shape[1]
+        buffer = np.empty(shape=[min(batchSize, numRows), numCols], dtype=np.float32)
+
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(numRows)
+        for start in range(0, numRows, batchSize):
+            stop = min(start + batchSize, numRows)
+            batch = buffer[:stop - start]
+            if shuffle:
+                # sorted gather keeps page access sequential, the row order
+                # inside a batch does not change the summed gradients
+                indices = np.sort(order[start:stop])
+                np.take(self.rows, indices, axis=0, out=batch)
+            else:
+                batch[:] = self.rows[start:stop]
+            yield batch
+
+# end class MemmapDataset
+
+
+def main():
+    import tempfile
+
+    print("\nBegin memmap dataset demo \n")
+
+    numRows = 1000
+    allData = nn3.makeData(4, 5, 3, numRows, nn_seed=1)
+    path = os.path.join(tempfile.mkdtemp(), "data.f32")
+    print("Writing " + str(numRows) + " rows to " + path)
+    data = MemmapDataset.fromArray(path, allData, numFeatures=4)
+    (trainData, testData) = data.split(trainPct=0.80)
+
+    nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=16)
+    maxEpochs = 100
+    learnRate = 0.01
+    print("Starting training (mini-batch, streamed)")
+    for epoch in range(maxEpochs):
+        for batch in trainData.batches(16, seed=epoch):
+            nn.computeGradients(batch[:, :4], batch[:, 4:])
+            nn.updateWeights(nn.grads, learnRate)
+    print("Training complete")
+
+    print("Accuracy on train data = %0.4f " % nn.accuracy(trainData.rows))
+    print("Accuracy on test data  = %0.4f " % nn.accuracy(testData.rows))
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
@@ -0,0 +1,278 @@
+# gpuref.py
+# Python 3.x
+
+import numpy as np
+import random
+
+# CPU reference for the GPU training pipeline in shaders/.
+#
+# ShaderNetwork keeps the exact buffers of shaders/include/buffers.gdshaderinc,
+# all float32 and flat:
+#   weights      per layer a [to][from] block starting at weight_offsets[l]
+#   biases       neuronsCount values, see the bias note below
+#   errors       one value per neuron, starting at offsets[l]
+#   activations  one value per neuron, double buffered like
+#                ComputeDoubleBuffer.gd: swap() exchanges the buffer bound
+#                as activations with the one bound as next_activations
+# and one training step runs the passes in pipeline order:
+#   sample.glsl    copy row current_sample into both activation buffers
+#   forward.glsl   sigmoid(weights . previous activations + bias), layer by layer
+#   backward.glsl  error terms from the output back, bias update
+#   update.glsl    weights += LEARNING_RATE * activation[from] * error[to]
+# The forward and backward shaders resolve every layer in one dispatch;
+# here the layers are evaluated in dependency order, which is the result
+# of one dispatch per layer.
+#
+# The shaders are reproduced as written, including the parts that are not
+# textbook backpropagation, so a GPU run can be checked against this one:
+#   - sigmoid_derivative is applied to the activation, so the error term
+#     is e * s(a) * (1 - s(a)) with a = sigmoid(z), not e * a * (1 - a)
+#   - forward reads the bias of neuron i of layer l at
+#     offsets[l] - layer_sizes[0] + i, backward updates
+#     offsets[l] + i, so the bias buffer has neuronsCount entries and
+#     updates land layer_sizes[0] slots past the ones that are read
+#   - the error is target - output and updates are added, which is
+#     gradient descent on the squared error with a fixed LEARNING_RATE
+#
+# With exact=True every weighted sum is accumulated one term at a time in
+# index order in float32, the order of the shader loops, and the result
+# differs from a GPU run only where the GPU rounds exp() or contracts
+# a multiply-add differently. The default uses np.dot, which sums in
+# another order and is several times faster; both agree to float32
+# rounding.
+
+MAX_LAYERS = 16
+MAX_NEURONS_PER_LAYER = 256
+LEARNING_RATE = np.float32(0.01)
+
+
+def sigmoid(x, out=None):
+    # 1.0 / (1.0 + exp(-x)) as in shared.gdshaderinc, in float32
+    out = np.negative(x, out=out)
+    np.exp(out, out=out)
+    out += np.float32(1.0)
+    return np.reciprocal(out, out=out)
+
+
+def sigmoidDerivative(x, out=None):
+    # sigmoid_derivative: s(x) * (1 - s(x)) of its argument
+    s = sigmoid(x, out=out)
+    return np.multiply(s, np.float32(1.0) - s, out=s)
+
+
+class ShaderNetwork:
+
+    def __init__(self, layerSizes, seed=0, exact=False):
+        if not 2 <= len(layerSizes) <= MAX_LAYERS:
+            raise ValueError("expected 2 to %d layers" % MAX_LAYERS)
+        if max(layerSizes) > MAX_NEURONS_PER_LAYER:
+            raise ValueError("layers are limited to %d neurons" % MAX_NEURONS_PER_LAYER)
+
+        self.layerSizes = list(layerSizes)
+        self.layerCount = len(self.layerSizes)
+        self.ni = self.layerSizes[0]
+        self.no = self.layerSizes[-1]
+        self.exact = exact
+        self.rnd = random.Random(seed)
+
+        # offsets and weight_offsets of the NetworkConfig uniform
+        self.offsets = []
+        self.weightOffsets = []
+        neurons = 0
+        numWeights = 0
+        for l in range(self.layerCount):
+            self.offsets.append(neurons)
+            self.weightOffsets.append(numWeights)
+            neurons += self.layerSizes[l]
+            if l < self.layerCount - 1:
+                numWeights += self.layerSizes[l] * self.layerSizes[l+1]
+        self.neuronsCount = neurons
+
+        self.weights = np.zeros(shape=[numWeights], dtype=np.float32)
+        self.biases = np.zeros(shape=[self.neuronsCount], dtype=np.float32)
+        self.errors = np.zeros(shape=[self.neuronsCount], dtype=np.float32)
+        self.buffers = [np.zeros(shape=[self.neuronsCount], dtype=np.float32) for _ in range(2)]
+        self.state = 0
+        self.swap()
+
+        # views into the flat buffers, per layer
+        self.layerWeights = []  # layerWeights[l] is [to][from] from layer l to l+1
+        for l in range(self.layerCount - 1):
+            start = self.weightOffsets[l]
+            (nFrom, nTo) = (self.layerSizes[l], self.layerSizes[l+1])
+            self.layerWeights.append(self.weights[start:start + nTo * nFrom].reshape(nTo, nFrom))
+        # index 0 is the input layer, it has no biases
+        self.forwardBiases = [None] + [self.biases[self.offsets[l] - self.ni:
+                                                   self.offsets[l] - self.ni + self.layerSizes[l]]
+                                       for l in range(1, self.layerCount)]
+        self.backwardBiases = [None] + [self.neuronSlice(self.biases, l)
+                                        for l in range(1, self.layerCount)]
+        self.layerErrors = [self.neuronSlice(self.errors, l) for l in range(self.layerCount)]
+        self.scratch = np.zeros(shape=[max(self.layerSizes)], dtype=np.float32)
+
+        self.trainingData = np.zeros(shape=[0], dtype=np.float32)
+        self.targetOutputs = np.zeros(shape=[0], dtype=np.float32)
+
+        self.initializeWeights()
+
+    def neuronSlice(self, flat, layer):
+        start = self.offsets[layer]
+        return flat[start:start + self.layerSizes[layer]]
+
+    def swap(self):
+        # the buffer bound as activations and the one bound as
+        # next_activations trade places
+        self.activations = self.buffers[self.state]
+        self.nextActivations = self.buffers[1 - self.state]
+        self.state = 1 - self.state
+
+    def initializeWeights(self):
+        lo = -0.01
+        hi = +0.01
+        for i in range(len(self.weights)):
+            self.weights[i] = (hi - lo) * self.rnd.random() + lo
+        self.biases[:] = 0.0
+
+    def setData(self, trainingData, targetOutputs):
+        # rows of inputs and of targets, stored flat like the
+        # training_data and target_outputs buffers
+        self.trainingData = np.ascontiguousarray(trainingData, dtype=np.float32).reshape(-1)
+        self.targetOutputs = np.ascontiguousarray(targetOutputs, dtype=np.float32).reshape(-1)
+        self.numSamples = len(self.trainingData) // self.ni
+
+    def configBuffer(self):
+        # the NetworkConfig uniform as int32 values, its tobytes() is the
+        # data to upload at binding 0
+        def padded(values):
+            return values + [0] * (MAX_LAYERS - len(values))
+        return np.array(padded(self.layerSizes) + padded(self.weightOffsets) +
+                        padded(self.offsets) + [self.layerCount, self.neuronsCount],
+                        dtype=np.int32)
+
+    # -----
+    # one function per shader
+
+    def samplePass(self, currentSample):
+        start = currentSample * self.ni
+        row = self.trainingData[start:start + self.ni]
+        self.activations[:self.ni] = row
+        self.nextActivations[:self.ni] = row
+
+    def weightedSums(self, w, values, out):
+        # out[i] = sum over j of w[i, j] * values[j]
+        if not self.exact:
+            return np.dot(w, values, out=out)
+        out[:] = 0.0
+        for j in range(len(values)):
+            out += w[:, j] * values[j]
+        return out
+
+    def forwardPass(self):
+        for l in range(1, self.layerCount):
+            sums = self.scratch[:self.layerSizes[l]]
+            self.weightedSums(self.layerWeights[l-1], self.neuronSlice(self.activations, l - 1), sums)
+            sums += self.forwardBiases[l]
+            sigmoid(sums, out=self.neuronSlice(self.activations, l))
+
+    def backwardPass(self, currentSample):
+        last = self.layerCount - 1
+        for l in range(last, 0, -1):
+            error = self.scratch[:self.layerSizes[l]]
+            if l == last:
+                start = currentSample * self.no
+                np.subtract(self.targetOutputs[start:start + self.no],
+                            self.neuronSlice(self.activations, l), out=error)
+            else:
+                # transposed weights of the next layer, [from][to]
+                self.weightedSums(self.layerWeights[l].T, self.layerErrors[l+1], error)
+            derivative = sigmoidDerivative(self.neuronSlice(self.activations, l),
+                                           out=self.layerErrors[l])
+            derivative *= error
+            self.backwardBiases[l] += LEARNING_RATE * self.layerErrors[l]
+
+    def updatePass(self):
+        for l in range(self.layerCount - 1):
+            gradient = np.multiply.outer(self.layerErrors[l+1], self.neuronSlice(self.activations, l))
+            gradient *= LEARNING_RATE
+            self.layerWeights[l] += gradient
+
+    # -----
+
+    def trainSample(self, currentSample):
+        self.samplePass(currentSample)
+        self.forwardPass()
+        self.backwardPass(currentSample)
+        self.updatePass()
+
+    def trainEpoch(self, order=None):
+        # one step per sample, in order or in the given sample order
+        for currentSample in (range(self.numSamples) if order is None else order):
+            self.trainSample(currentSample)
+
+    def computeOutputs(self, xValues):
+        # output activations for one input row, through the same passes
+        self.activations[:self.ni] = xValues
+        self.forwardPass()
+        return self.neuronSlice(self.activations, self.layerCount - 1).copy()
+
+    def computeOutputsBatch(self, xValues):
+        # output rows for a matrix of input rows, for evaluation. Uses
+        # matrix products, so it matches forwardPass to float32 rounding
+        # rather than bit for bit.
+        a = np.asarray(xValues, dtype=np.float32)
+        for l in range(1, self.layerCount):
+            a = sigmoid(np.dot(a, self.layerWeights[l-1].T) + self.forwardBiases[l])
+        return a
+
+    def meanSquaredError(self, xValues, tValues):
+        diff = self.computeOutputsBatch(xValues) - tValues
+        return float(np.mean(np.sum(diff * diff, axis=1)))
+
+    def accuracy(self, xValues, tValues):
+        outputs = self.computeOutputsBatch(xValues)
+        return float(np.mean(np.argmax(outputs, axis=1) == np.argmax(tValues, axis=1)))
+
+# end class ShaderNetwork
+
+
+def main():
+    import time
+
+    import nn3
+
+    print("\nBegin GPU reference demo \n")
+
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+    (xTrain, tTrain) = (trainData[:, :4], trainData[:, 4:])
+    (xTest, tTest) = (testData[:, :4], testData[:, 4:])
+    layerSizes = [4, 16, 16, 3]
+    maxEpochs = 50
+
+    print("Layer sizes " + str(layerSizes) + ", NetworkConfig " +
+          str(ShaderNetwork(layerSizes).configBuffer().nbytes) + " bytes")
+    print("mode     samples/sec   ms error   accuracy")
+    results = {}
+    for exact in (False, True):
+        net = ShaderNetwork(layerSizes, seed=13, exact=exact)
+        net.setData(xTrain, tTrain)
+        start = time.perf_counter()
+        for epoch in range(maxEpochs):
+            net.trainEpoch()
+        seconds = time.perf_counter() - start
+        results[exact] = net
+        print("%-6s  %12.0f   %8.4f   %8.4f" %
+              ("exact" if exact else "fast", maxEpochs * net.numSamples / seconds,
+               net.meanSquaredError(xTest, tTest), net.accuracy(xTest, tTest)))
+
+    difference = np.abs(results[False].weights - results[True].weights).max()
+    print("\nLargest weight difference fast vs exact after " + str(maxEpochs) +
+          " epochs = %0.2e " % difference)
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
@@ -0,0 +1,358 @@
+# layerstack.py
+# Python 3.x
+
+import numpy as np
+import random
+
+import activations
+from callbacks import CallbackList
+import metrics
+import nn3
+import optimizers
+from precision import asCompute, policyFor
+import profiling
+
+# Multi layer perceptron with any number of hidden layers.
+#
+# All parameters live in one contiguous buffer, float32 unless another
+# precision is asked for (see precision.py). Each layer owns a
+# weight block followed by a bias block, found through weightOffsets and
+# biasOffsets (like weight_offsets in shaders/include/buffers.gdshaderinc).
+# For a single hidden layer the buffer has the same order as
+# nn3.NeuralNetwork.getWeights(): ihWeights, hBiases, hoWeights, oBiases.
+#
+# Node activations and signals are kept in a workspace sized for maxBatch
+# rows, so forward and backward passes write into existing arrays instead
+# of allocating per layer. Activations are picked per layer by name from
+# the activations registry.
+
+
+class LayerStack:
+
+    def __init__(self, layerSizes, activationNames, seed, maxBatch=1, loss='meanSquared',
+                 optimizer=None, weights=None, precision=None):
+        if len(layerSizes) < 2:
+            raise ValueError("layerSizes needs at least an input and an output layer")
+        if len(activationNames) != len(layerSizes) - 1:
+            raise ValueError("expected one activation per non-input layer")
+
+        self.layerSizes = list(layerSizes)
+        self.activations = list(activationNames)
+        self.numLayers = len(self.layerSizes) - 1  # layers with weights
+        self.ni = self.layerSizes[0]
+        self.no = self.layerSizes[-1]
+        self.functions = [activations.get(name) for name in self.activations]
+        self.precision = policyFor(precision)
+        self.dtype = self.precision.compute
+
+        # 'meanSquared' or 'crossEntropy', as in nn3.NeuralNetwork
+        if loss not in ('meanSquared', 'crossEntropy'):
+            raise ValueError("unknown loss '%s'" % loss)
+        if loss == 'crossEntropy' and self.activations[-1].lower() != 'softmax':
+            raise ValueError("crossEntropy loss needs a softmax output activation")
+        self.loss = loss
+
+        # offsets of each layer's weight and bias block in the flat buffer
+        self.weightOffsets = []
+        self.biasOffsets = []
+        offset = 0
+        for l in range(self.numLayers):
+            self.weightOffsets.append(offset)
+            offset += self.layerSizes[l] * self.layerSizes[l+1]
+            self.biasOffsets.append(offset)
+            offset += self.layerSizes[l+1]
+
+        # weights may be an existing flat buffer (a memory-mapped
+        # checkpoint for example), used as is and not initialized
+        if weights is None:
+            self.bindWeights(np.zeros(shape=[offset], dtype=self.dtype))
+        else:
+            self.bindWeights(weights)
+        self.grads = np.zeros(shape=[offset], dtype=self.precision.accumulate)
+        (self.layerWeightGrads, self.layerBiasGrads) = self.layerViews(self.grads)
+
+        # update rule, an optimizers.Optimizer or its name, default SGD
+        self.optimizer = optimizers.create(optimizer)
+
+        # per phase timing, see profiling.py, off by default
+        self.profiler = profiling.NULL
+
+        self.maxBatch = 0
+        self.resizeWorkspace(maxBatch)
+
+        self.rnd = random.Random(seed)  # allows multiple instances
+        if weights is None:
+            self.initializeWeights()
+
+    def layerViews(self, flat):
+        weights = []
+        biases = []
+        for l in range(self.numLayers):
+            (nIn, nOut) = (self.layerSizes[l], self.layerSizes[l+1])
+            w = self.weightOffsets[l]
+            b = self.biasOffsets[l]
+            weights.append(flat[w:w + nIn * nOut].reshape(nIn, nOut))
+            biases.append(flat[b:b + nOut])
+        return (weights, biases)
+
+    def bindWeights(self, flat):
+        # point the per-layer views at another flat buffer, no copy
+        self.weights = flat
+        (self.layerWeights, self.layerBiases) = self.layerViews(flat)
+
+    def __setstate__(self, state):
+        # views into the flat buffers come back from pickle as separate
+        # copies, so point them at the buffers again
+        self.__dict__.update(state)
+        self.bindWeights(self.weights)
+        (self.layerWeightGrads, self.layerBiasGrads) = self.layerViews(self.grads)
+
+    def resizeWorkspace(self, maxBatch):
+        if maxBatch <= self.maxBatch:
+            return
+        self.maxBatch = maxBatch
+        width = max(self.layerSizes)
+        self.nodes = [np.zeros(shape=[maxBatch, n], dtype=self.dtype)
+                      for n in self.layerSizes[1:]]
+        self.signals = [np.zeros(shape=[maxBatch, n], dtype=self.dtype)
+                        for n in self.layerSizes[1:]]
+        self.derivatives = np.zeros(shape=[maxBatch, width], dtype=self.dtype)
+        self.rowScratch = np.zeros(shape=[maxBatch, 1], dtype=self.dtype)
+        self.batch = np.zeros(shape=[maxBatch, self.ni + self.no], dtype=self.dtype)
+
+    def setWeights(self, weights):
+        if len(weights) != len(self.weights):
+            print("Warning: len(weights) error in setWeights()")
+        self.weights[:] = weights
+
+    def getWeights(self):
+        return self.weights.copy()
+
+    def initializeWeights(self):
+        lo = -0.01
+        hi = 0.01
+        wts = np.fromiter(((hi - lo) * self.rnd.random() + lo
+                           for _ in range(len(self.weights))),
+                          dtype=self.dtype, count=len(self.weights))
+        self.setWeights(wts)
+
+    def computeOutputs(self, xValues):
+        result = self.computeOutputsBatch(np.reshape(xValues, (1, self.ni)))
+        return result[0].copy()
+
+    def computeOutputsBatch(self, xValues):
+        # forward pass, returns a view of the output nodes that is
+        # overwritten by the next call
+        xValues = asCompute(xValues, self.dtype)
+        n = len(xValues)
+        self.resizeWorkspace(n)
+        prev = xValues
+        for l in range(self.numLayers):
+            nodes = self.nodes[l][:n]
+            np.matmul(prev, self.layerWeights[l], out=nodes)
+            np.add(nodes, self.layerBiases[l], out=nodes)
+            self.functions[l].activate(nodes, out=nodes, scratch=self.rowScratch[:n])
+            prev = nodes
+        return prev
+
+    def computeGradients(self, xValues, tValues):
+        # forward and backward pass, gradients summed over the batch
+        # into self.grads
+        profiler = self.profiler
+        xValues = asCompute(xValues, self.dtype)
+        tValues = asCompute(tValues, self.dtype)
+        n = len(xValues)
+        oNodes = self.computeOutputsBatch(xValues)
+        profiler.mark(profiling.ACTIVATION)
+
+        accumulate = self.precision.accumulate
+        l = self.numLayers - 1
+        signals = self.signals[l][:n]
+        if self.loss == 'crossEntropy':
+            # fused softmax + cross-entropy, the signals are just (o-t)
+            np.subtract(oNodes, tValues, out=signals)
+        else:
+            # output signals, E=(t-o)^2 so E'=(o-t)
+            derivative = self.derivatives[:n, :self.no]
+            self.functions[l].differentiate(oNodes, out=derivative)
+            np.subtract(oNodes, tValues, out=signals)
+            np.multiply(signals, derivative, out=signals)
+        profiler.mark(profiling.DELTA)
+
+        while True:
+            prev = xValues if l == 0 else self.nodes[l-1][:n]
+            # summed in the accumulate dtype, see precision.py
+            np.matmul(prev.T, signals, out=self.layerWeightGrads[l], dtype=accumulate)
+            np.sum(signals, axis=0, out=self.layerBiasGrads[l], dtype=accumulate)
+            profiler.mark(profiling.GRADIENT)
+            if l == 0:
+                break
+
+            # hidden signals from the layer above
+            size = self.layerSizes[l]
+            prevSignals = self.signals[l-1][:n]
+            derivative = self.derivatives[:n, :size]
+            np.matmul(signals, self.layerWeights[l].T, out=prevSignals)
+            self.functions[l-1].differentiate(prev, out=derivative)
+            np.multiply(prevSignals, derivative, out=prevSignals)
+            profiler.mark(profiling.DELTA)
+            signals = prevSignals
+            l -= 1
+
+        return self.grads
+
+    def updateWeights(self, grads, learnRate):
+        self.optimizer.step(self.weights, grads, learnRate)
+
+    def trainOnline(self, trainData, maxEpochs, learnRate, callbacks=None, verbose=True):
+        return self.trainMiniBatch(trainData, maxEpochs, learnRate, 1, callbacks, verbose)
+
+    def trainBatch(self, trainData, maxEpochs, learnRate, callbacks=None, verbose=True):
+        # full batch, no shuffling needed
+        trainData = asCompute(trainData, self.dtype)
+        x_values = trainData[:, :self.ni]
+        t_values = trainData[:, self.ni:self.ni+self.no]
+        epoch = 0
+        profiler = self.profiler
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self, logs)
+
+        while epoch < maxEpochs:
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
+            profiler.begin()
+            self.computeGradients(x_values, t_values)
+            self.updateWeights(self.grads, learnRate)
+            profiler.mark(profiling.UPDATE)
+
+            epoch += 1
+
+            if verbose and epoch % 25 == 0:
+                profiler.begin()
+                mse = self.meanSquaredError(trainData)
+                print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+                profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
+
+        callbackList.trainEnd(logs)
+        result = self.getWeights()
+        return result
+
+    def trainMiniBatch(self, trainData, maxEpochs, learnRate, batchSize, callbacks=None,
+                       verbose=True):
+        # gradients are summed per batch, like nn3.trainMiniBatch
+        numTrainItems = len(trainData)
+        trainData = asCompute(trainData, self.dtype)
+        self.resizeWorkspace(min(batchSize, numTrainItems))
+        indices = np.arange(numTrainItems)
+        epoch = 0
+        profiler = self.profiler
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self, logs)
+
+        while epoch < maxEpochs:
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
+            self.rnd.shuffle(indices)  # scramble order once per epoch
+            for start in range(0, numTrainItems, batchSize):
+                profiler.begin()
+                batchIndices = indices[start:start+batchSize]
+                batch = self.batch[:len(batchIndices)]
+                np.take(trainData, batchIndices, axis=0, out=batch)
+                profiler.mark(profiling.LOAD)
+                self.computeGradients(batch[:, :self.ni],
+                                      batch[:, self.ni:self.ni+self.no])
+                self.updateWeights(self.grads, learnRate)
+                profiler.mark(profiling.UPDATE)
+
+            epoch += 1
+
+            if verbose and epoch % 25 == 0:
+                profiler.begin()
+                mse = self.meanSquaredError(trainData)
+                print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+                profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
+
+        callbackList.trainEnd(logs)
+        result = self.getWeights()
+        return result
+
+    def evaluate(self, tdata, chunkSize=metrics.DEFAULT_CHUNK_SIZE):
+        # accuracy, ms error and confusion matrix from one batched pass
+        return metrics.evaluate(self.computeOutputsBatch, tdata[:, :self.ni],
+                                tdata[:, self.ni:self.ni+self.no], chunkSize)
+
+    def accuracy(self, tdata):  # train or test data matrix
+        return self.evaluate(tdata).accuracy
+
+    def meanSquaredError(self, tdata):  # on train or test data matrix
+        return self.evaluate(tdata).meanSquaredError
+
+    def crossEntropyError(self, tdata, chunkSize=metrics.DEFAULT_CHUNK_SIZE):
+        # mean softmax cross-entropy, from the output sums via log-sum-exp
+        l = self.numLayers - 1
+        sumError = 0.0
+        for start in range(0, len(tdata), chunkSize):
+            rows = tdata[start:start+chunkSize]
+            xValues = rows[:, :self.ni]
+            self.computeOutputsBatch(xValues)
+            prev = xValues if l == 0 else self.nodes[l-1][:len(rows)]
+            oSums = prev @ self.layerWeights[l] + self.layerBiases[l]
+            sumError += metrics.crossEntropy(oSums, rows[:, self.ni:self.ni+self.no])
+        return sumError / len(tdata)
+
+    def totalWeights(self):
+        return len(self.weights)
+
+# end class LayerStack
+
+
+def main():
+    print("\nBegin layer stack demo \n")
+
+    numRows = 1000
+    print("Generating " + str(numRows) + " rows of synthetic data \n")
+    allData = nn3.makeData(4, 5, 3, numRows, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+
+    layerSizes = [4, 10, 7, 3]
+    activationNames = ['tanh', 'tanh', 'softmax']
+    print("Creating a " + "-".join(str(n) for n in layerSizes) +
+          " neural network")
+    nn = LayerStack(layerSizes, activationNames, seed=13, maxBatch=16)
+
+    maxEpochs = 100
+    learnRate = 0.01
+    batchSize = 16
+    print("\nSetting maxEpochs = " + str(maxEpochs))
+    print("Setting learning rate = %0.3f " % learnRate)
+    print("Setting batch size = " + str(batchSize))
+
+    print("Starting training (mini-batch)")
+    nn.trainMiniBatch(trainData, maxEpochs, learnRate, batchSize)
+    print("Training complete")
+
+    print("Accuracy on train data = %0.4f " % nn.accuracy(trainData))
+    print("Accuracy on test data  = %0.4f " % nn.accuracy(testData))
+
+    print("\nTest data evaluation:")
+    metrics.showEvaluation(nn.evaluate(testData))
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
@@ -0,0 +1,76 @@
+# metrics.py
+# Python 3.x
+
+import collections
+
+import numpy as np
+
+# Batched evaluation shared by the Python models.
+#
+# The dataset is pushed through the model in chunks of chunkSize rows, so
+# memory stays bounded by the chunk and not by the size of the test set.
+# Accuracy, mean squared error and the confusion matrix all come out of
+# the same forward pass.
+
+Evaluation = collections.namedtuple(
+    'Evaluation', ['accuracy', 'meanSquaredError', 'confusion', 'classCounts'])
+# accuracy          fraction of rows where the target at argmax(output) is 1
+# meanSquaredError  sum of (t-o)^2 over outputs, averaged over rows
+# confusion         [actual class, predicted class] counts
+# classCounts       number of rows per actual class
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def evaluate(forward, xValues, tValues, chunkSize=DEFAULT_CHUNK_SIZE):
+    # forward maps a (rows, inputs) matrix to (rows, outputs) values
+    numRows = len(xValues)
+    numClasses = tValues.shape[1]
+    confusion = np.zeros(shape=[numClasses * numClasses], dtype=np.int64)
+    numCorrect = 0
+    sumSquaredError = 0.0
+
+    for start in range(0, numRows, chunkSize):
+        x_values = xValues[start:start+chunkSize]
+        t_values = tValues[start:start+chunkSize]
+        y_values = forward(x_values)
+
+        predicted = np.argmax(y_values, axis=1)
+        actual = np.argmax(t_values, axis=1)
+        hits = t_values[np.arange(len(t_values)), predicted]
+        numCorrect += np.count_nonzero(np.abs(hits - 1.0) < 1.0e-5)
+
+        err = t_values - y_values  # target - output to be consistent
+        sumSquaredError += float(np.einsum('ij,ij->', err, err, dtype=np.float64))
+
+        confusion += np.bincount(actual * numClasses + predicted,
+                                 minlength=numClasses * numClasses)
+
+    confusion = confusion.reshape(numClasses, numClasses)
+    return Evaluation(numCorrect * 1.0 / numRows, sumSquaredError / numRows,
+                      confusion, confusion.sum(axis=1))
+
+
+def logSumExp(z):
+    # log(sum(exp(z))) per row, shifted by the row max so exp never overflows
+    m = np.max(z, axis=-1, keepdims=True)
+    return (m + np.log(np.sum(np.exp(z - m), axis=-1, keepdims=True)))[..., 0]
+
+
+def crossEntropy(logits, tValues):
+    # summed softmax cross-entropy straight from the output sums,
+    # -sum(t * log(softmax(z))) = sum(t) * logSumExp(z) - sum(t * z)
+    lse = logSumExp(logits)
+    return float(np.sum(np.sum(tValues, axis=-1) * lse) - np.sum(tValues * logits))
+
+
+def showEvaluation(result):
+    print("Accuracy = %0.4f " % result.accuracy)
+    print("ms error = %0.4f " % result.meanSquaredError)
+    print("Confusion (rows actual, columns predicted):")
+    width = len(str(result.confusion.max()))
+    for (k, row) in enumerate(result.confusion):
+        print("[" + str(k) + "] " + " ".join(str(c).rjust(width) for c in row) +
+              "   n = " + str(result.classCounts[k]))
+
+# end script
@@ -1,59 +1,163 @@
 import numpy as np
 
+import activations
+from callbacks import CallbackList
+import optimizers
+from precision import asCompute, policyFor
+import profiling
+
 class NeuralNetwork:
-    def __init__(self, input_size, hidden_size, output_size):
+    def __init__(self, input_size, hidden_size, output_size, max_batch=1, activation='sigmoid',
+                 optimizer=None, params=None, precision=None):
         # Define the structure of the neural network
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.output_size = output_size
 
-        # Initialize weights and biases with random values
-        self.weights_ih = np.random.randn(self.input_size, self.hidden_size)
-        self.weights_ho = np.random.randn(self.hidden_size, self.output_size)
-        self.bias_h = np.zeros((1, self.hidden_size))
-        self.bias_o = np.zeros((1, self.output_size))
+        # Activation function for both layers, looked up by name
+        self.activation = activations.get(activation)
+
+        # Floating point policy, see precision.py. Parameters and buffers
+        # use the compute dtype (float32 by default), gradients the
+        # accumulate dtype
+        self.precision = policyFor(precision)
+        self.dtype = self.precision.compute
+
+        # All weights and biases share one flat buffer so an optimizer
+        # can update them in a single pass, the named arrays are views
+        num_params = (input_size * hidden_size + hidden_size * output_size +
+                      hidden_size + output_size)
+        if params is not None:
+            # Use an existing buffer, e.g. a memory-mapped checkpoint
+            self.bind_params(params)
+        else:
+            self.bind_params(np.zeros(num_params, dtype=self.dtype))
+
+            # Initialize weights with random values, biases start at zero
+            self.weights_ih[:] = np.random.randn(self.input_size, self.hidden_size)
+            self.weights_ho[:] = np.random.randn(self.hidden_size, self.output_size)
+
+        # Gradient buffer, same layout as the parameters
+        self.grads = np.zeros(num_params, dtype=self.precision.accumulate)
+        (self.grad_ih, self.grad_ho, self.grad_bias_h, self.grad_bias_o) = self.param_views(self.grads)
+
+        # Update rule, an optimizers.Optimizer or its name, default SGD
+        self.optimizer = optimizers.create(optimizer)
+
+        # Per phase timing, see profiling.py, off by default
+        self.profiler = profiling.NULL
+
+        # Workspace for the intermediates of up to max_batch samples
+        self.max_batch = 0
+        self.resize_workspace(max_batch)
 
-    def sigmoid(self, x):
-        # Sigmoid activation function
-        return 1 / (1 + np.exp(-x))
+    def param_views(self, flat):
+        # Split a flat parameter sized buffer into
+        # (weights_ih, weights_ho, bias_h, bias_o) views
+        shapes = ((self.input_size, self.hidden_size), (self.hidden_size, self.output_size),
+                  (1, self.hidden_size), (1, self.output_size))
+        views = []
+        offset = 0
+        for shape in shapes:
+            size = shape[0] * shape[1]
+            views.append(flat[offset:offset + size].reshape(shape))
+            offset += size
+        return tuple(views)
 
-    def sigmoid_derivative(self, x):
+    def bind_params(self, flat):
+        # Use flat (e.g. a loaded checkpoint) as the parameter buffer
+        self.params = flat
+        (self.weights_ih, self.weights_ho, self.bias_h, self.bias_o) = self.param_views(flat)
+
+    def resize_workspace(self, max_batch):
+        # (Re)allocate the per sample buffers, only ever grows
+        if max_batch <= self.max_batch:
+            return
+        self.max_batch = max_batch
+        self.hidden_buffer = np.zeros((max_batch, self.hidden_size), dtype=self.dtype)
+        self.hidden_error_buffer = np.zeros((max_batch, self.hidden_size), dtype=self.dtype)
+        self.hidden_derivative_buffer = np.zeros((max_batch, self.hidden_size), dtype=self.dtype)
+        self.output_buffer = np.zeros((max_batch, self.output_size), dtype=self.dtype)
+        self.output_error_buffer = np.zeros((max_batch, self.output_size), dtype=self.dtype)
+        self.output_derivative_buffer = np.zeros((max_batch, self.output_size), dtype=self.dtype)
+
+    def sigmoid(self, x, out=None):
+        # Sigmoid activation function, in place when out is x
+        return activations.get('sigmoid').activate(x, out=out)
+
+    def sigmoid_derivative(self, x, out=None):
         # Derivative of the sigmoid function
-        return x * (1 - x)
+        return activations.get('sigmoid').differentiate(x, out=out)
 
     def forward(self, X):
-        # Perform forward propagation
-        self.hidden_layer_input = np.dot(X, self.weights_ih) + self.bias_h
-        self.hidden_layer_output = self.sigmoid(self.hidden_layer_input)
-        self.output_layer_input = np.dot(self.hidden_layer_output, self.weights_ho) + self.bias_o
-        predicted_output = self.sigmoid(self.output_layer_input)
+        # Perform forward propagation into the workspace
+        # The returned array is overwritten by the next call
+        X = asCompute(X, self.dtype).reshape(-1, self.input_size)
+        n = len(X)
+        self.resize_workspace(n)
+
+        self.hidden_layer_output = self.hidden_buffer[:n]
+        np.dot(X, self.weights_ih, out=self.hidden_layer_output)
+        self.hidden_layer_output += self.bias_h
+        self.activation.activate(self.hidden_layer_output, out=self.hidden_layer_output)
+
+        predicted_output = self.output_buffer[:n]
+        np.dot(self.hidden_layer_output, self.weights_ho, out=predicted_output)
+        predicted_output += self.bias_o
+        self.activation.activate(predicted_output, out=predicted_output)
         return predicted_output
 
     def backpropagation(self, X, y, learning_rate):
         # Perform backpropagation to adjust weights and biases
+        profiler = self.profiler
+        profiler.begin()
+        X = asCompute(X, self.dtype).reshape(-1, self.input_size)
+        y = asCompute(y, self.dtype)
+        n = len(X)
         predicted_output = self.forward(X)
+        profiler.mark(profiling.ACTIVATION)
 
-        # Calculate output layer error
-        output_error = y - predicted_output
-        output_delta = output_error * self.sigmoid_derivative(predicted_output)
+        # Calculate output layer error, as the gradient of the loss (o - y)
+        output_delta = np.subtract(predicted_output, y, out=self.output_error_buffer[:n])
+        output_delta *= self.activation.differentiate(predicted_output, out=self.output_derivative_buffer[:n])
 
         # Calculate hidden layer error
-        hidden_error = output_delta.dot(self.weights_ho.T)
-        hidden_delta = hidden_error * self.sigmoid_derivative(self.hidden_layer_output)
+        hidden_delta = np.dot(output_delta, self.weights_ho.T, out=self.hidden_error_buffer[:n])
+        hidden_delta *= self.activation.differentiate(self.hidden_layer_output, out=self.hidden_derivative_buffer[:n])
+        profiler.mark(profiling.DELTA)
+
+        # Compute gradients, summed in the accumulate dtype
+        accumulate = self.precision.accumulate
+        np.matmul(self.hidden_layer_output.T, output_delta, out=self.grad_ho, dtype=accumulate)
+        np.matmul(X.T, hidden_delta, out=self.grad_ih, dtype=accumulate)
+        np.sum(output_delta, axis=0, keepdims=True, out=self.grad_bias_o, dtype=accumulate)
+        np.sum(hidden_delta, axis=0, keepdims=True, out=self.grad_bias_h, dtype=accumulate)
+        profiler.mark(profiling.GRADIENT)
 
         # Update weights and biases
-        self.weights_ho += self.hidden_layer_output.T.dot(output_delta) * learning_rate
-        self.weights_ih += X.T.dot(hidden_delta) * learning_rate
-        self.bias_o += np.sum(output_delta, axis=0, keepdims=True) * learning_rate
-        self.bias_h += np.sum(hidden_delta, axis=0, keepdims=True) * learning_rate
+        self.optimizer.step(self.params, self.grads, learning_rate)
+        profiler.mark(profiling.UPDATE)
 
-    def train(self, X, y, epochs, learning_rate):
-        # Train the neural network for a specified number of epochs
+    def train(self, X, y, epochs, learning_rate, callbacks=None):
+        # Train the neural network for a specified number of epochs,
+        # callbacks see callbacks.py
+        callback_list = CallbackList(callbacks)
+        logs = {'learnRate': learning_rate}
+        callback_list.trainBegin(self, logs)
         for epoch in range(epochs):
-            self.backpropagation(X, y, learning_rate)
+            callback_list.epochBegin(epoch, logs)
+            self.backpropagation(X, y, logs['learnRate'])
             if (epoch + 1) % 1000 == 0:
+                self.profiler.begin()
                 loss = np.mean(np.square(y - self.forward(X)))
                 print(f"Epoch {epoch+1}/{epochs}, Loss: {loss:.4f}")
+                self.profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch + 1
+            callback_list.epochEnd(epoch + 1, logs)
+            if logs.get('stop'):
+                break
+        callback_list.trainEnd(logs)
 
 
 # Example usage:
@@ -63,7 +167,7 @@ if __name__ == "__main__":
     y = np.array([[0], [1], [1], [0]])
 
     # Create a neural network with 2 input nodes, 4 hidden nodes, and 1 output node
-    nn = NeuralNetwork(input_size=2, hidden_size=4, output_size=1)
+    nn = NeuralNetwork(input_size=2, hidden_size=4, output_size=1, max_batch=len(X))
 
     # Train the network for 10000 epochs with a learning rate of 0.1
     nn.train(X, y, epochs=10000, learning_rate=0.1)
@@ -1,7 +1,10 @@
 import numpy as np
-from scipy.special import expit as activation_function
 from scipy.stats import truncnorm
 
+import activations
+import metrics
+from precision import asCompute, policyFor
+
 def truncated_normal(mean=0, sd=1, low=0, upp=10):
     return truncnorm(
         (low - mean) / sd, (upp - mean) / sd, loc=mean, scale=sd)
@@ -12,11 +15,18 @@ class NeuralNetwork:
                  no_of_in_nodes,
                  no_of_out_nodes,
                  no_of_hidden_nodes,
-                 learning_rate):
+                 learning_rate,
+                 activation='sigmoid',
+                 precision=None):
         self.no_of_in_nodes = no_of_in_nodes
         self.no_of_out_nodes = no_of_out_nodes
         self.no_of_hidden_nodes = no_of_hidden_nodes
         self.learning_rate = learning_rate
+        self.activation = activations.get(activation)
+        # weights and vectors use the compute dtype of the precision
+        # policy, float32 unless asked otherwise (see precision.py)
+        self.precision = policyFor(precision)
+        self.dtype = self.precision.compute
         self.create_weight_matrices()
 
     def create_weight_matrices(self):
@@ -24,11 +34,11 @@ class NeuralNetwork:
         rad = 1 / np.sqrt(self.no_of_in_nodes)
         X = truncated_normal(mean=0, sd=1, low=-rad, upp=rad)
         self.weights_in_hidden = X.rvs((self.no_of_hidden_nodes,
-                                       self.no_of_in_nodes))
+                                       self.no_of_in_nodes)).astype(self.dtype)
         rad = 1 / np.sqrt(self.no_of_hidden_nodes)
         X = truncated_normal(mean=0, sd=1, low=-rad, upp=rad)
         self.weights_hidden_out = X.rvs((self.no_of_out_nodes,
-                                        self.no_of_hidden_nodes))
+                                        self.no_of_hidden_nodes)).astype(self.dtype)
 
 
     def train(self, input_vector, target_vector):
@@ -36,22 +46,23 @@ class NeuralNetwork:
         input_vector and target_vector can be tuples, lists or ndarrays
         """
         # make sure that the vectors have the right shape
-        input_vector = np.array(input_vector)
+        input_vector = np.array(input_vector, dtype=self.dtype)
         input_vector = input_vector.reshape(input_vector.size, 1)
-        target_vector = np.array(target_vector).reshape(target_vector.size, 1)
+        target_vector = np.array(target_vector, dtype=self.dtype)
+        target_vector = target_vector.reshape(target_vector.size, 1)
 
-        output_vector_hidden = activation_function(self.weights_in_hidden @ input_vector)
-        output_vector_network = activation_function(self.weights_hidden_out @ output_vector_hidden)
+        output_vector_hidden = self.activation.activate(self.weights_in_hidden @ input_vector)
+        output_vector_network = self.activation.activate(self.weights_hidden_out @ output_vector_hidden)
 
         output_error = target_vector - output_vector_network
         # calculate hidden errors:
         hidden_errors = self.weights_hidden_out.T @ output_error
 
-        tmp = output_error * output_vector_network * (1.0 - output_vector_network)
+        tmp = output_error * self.activation.differentiate(output_vector_network)
         self.weights_hidden_out += self.learning_rate  * (tmp @ output_vector_hidden.T)
 
         # update the weights:
-        tmp = hidden_errors * output_vector_hidden * (1.0 - output_vector_hidden)
+        tmp = hidden_errors * self.activation.differentiate(output_vector_hidden)
         self.weights_in_hidden += self.learning_rate * (tmp @ input_vector.T)
 
     def run(self, input_vector):
@@ -60,13 +71,22 @@ class NeuralNetwork:
         'input_vector' can be tuple, list or ndarray
         """
         # make sure that input_vector is a column vector:
-        input_vector = np.array(input_vector)
+        input_vector = np.array(input_vector, dtype=self.dtype)
         input_vector = input_vector.reshape(input_vector.size, 1)
-        input4hidden = activation_function(self.weights_in_hidden @ input_vector)
-        output_vector_network = activation_function(self.weights_hidden_out @ input4hidden)
+        input4hidden = self.activation.activate(self.weights_in_hidden @ input_vector)
+        output_vector_network = self.activation.activate(self.weights_hidden_out @ input4hidden)
         return output_vector_network
 
-    def evaluate(self, data, labels):
+    def run_batch(self, input_matrix):
+        """
+        running the network on a matrix with one input vector per row,
+        returns one output vector per row
+        """
+        input_matrix = asCompute(input_matrix, self.dtype)
+        output_hidden = self.activation.activate(input_matrix @ self.weights_in_hidden.T)
+        return self.activation.activate(output_hidden @ self.weights_hidden_out.T)
+
+    def evaluate(self, data, labels, chunk_size=metrics.DEFAULT_CHUNK_SIZE):
         """
         Counts how often the actual result corresponds to the
         target result.
@@ -76,16 +96,30 @@ class NeuralNetwork:
         e.g.
         res = [0.1, 0.132, 0.875]
         labels[i] = [0, 0, 1]
+        The data is run through the network chunk_size rows at a time.
         """
-        corrects, wrongs = 0, 0
-        for i in range(len(data)):
-            res = self.run(data[i])
-            res_max = res.argmax()
-            if res_max == labels[i].argmax():
-                corrects += 1
-            else:
-                wrongs += 1
+        result = metrics.evaluate(self.run_batch, np.asarray(data),
+                                  np.asarray(labels), chunk_size)
+        corrects = int(np.trace(result.confusion))
+        wrongs = len(data) - corrects
         return corrects, wrongs
 
 
 if __name__ == "__main__":
+    import nn3
+
+    data = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (train_data, test_data) = nn3.splitData(data, trainPct=0.80)
+
+    nn = NeuralNetwork(no_of_in_nodes=4,
+                       no_of_out_nodes=3,
+                       no_of_hidden_nodes=7,
+                       learning_rate=0.1)
+    for epoch in range(10):
+        for row in train_data:
+            nn.train(row[:4], row[4:])
+
+    corrects, wrongs = nn.evaluate(train_data[:, :4], train_data[:, 4:])
+    print("accuracy train: ", corrects / (corrects + wrongs))
+    corrects, wrongs = nn.evaluate(test_data[:, :4], test_data[:, 4:])
+    print("accuracy test: ", corrects / (corrects + wrongs))
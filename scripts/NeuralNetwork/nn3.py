@@ -3,52 +3,62 @@
 
 import numpy as np
 import random
-import math
 # import sys
 
-# helper functions
+import activations
+from callbacks import CallbackList
+import metrics
+import optimizers
+from precision import asCompute, getDefault, policyFor
+import profiling
 
+# helper functions
 
-def makeData(numFeatures, numHidden, numClasses, numRows, nn_seed):
 
-    nn = NeuralNetwork(numFeatures, numHidden, numClasses, nn_seed)
+def makeData(numFeatures, numHidden, numClasses, numRows, nn_seed,
+             out=None, chunkSize=65536):
+    # rows of uniform random features labelled one-hot by a random
+    # tanh-softmax network. Everything is drawn from one seeded
+    # np.random.Generator, so the result only depends on nn_seed and not
+    # on chunkSize. Rows are produced chunkSize at a time and written to
+    # out, which can be any (numRows, numFeatures + numClasses) array such
+    # as a np.memmap, so large datasets go straight to disk.
+    rng = np.random.default_rng(nn_seed)
+    nn = NeuralNetwork(numFeatures, numHidden, numClasses, nn_seed,
+                       maxBatch=min(chunkSize, numRows))
     numWts = nn.totalWeights(numFeatures, numHidden, numClasses)
-    wts = np.zeros(numWts, dtype=np.float32)
     w_lo = -9.0
     w_hi = +9.0
-    for i in range(0, numWts):
-        wts[i] = (w_hi - w_lo) * nn.rnd.random() + w_lo
-    nn.setWeights(wts)
+    nn.setWeights(rng.uniform(w_lo, w_hi, size=numWts).astype(np.float32))
 
     numCols = numFeatures + numClasses
-    result = np.zeros(shape=[numRows, numCols], dtype=np.float32)
+    if out is None:
+        out = np.zeros(shape=[numRows, numCols], dtype=np.float32)
     x_lo = -5.0
     x_hi = +5.0
-    for i in range(0, numRows):  # each row
-        x_vals = np.zeros(numFeatures, dtype=np.float32)
-        y_vals = np.zeros(numClasses, dtype=np.float32)
-        for j in range(0, numFeatures):
-            x_vals[j] = (x_hi - x_lo) * nn.rnd.random() + x_lo
-        y_vals = nn.computeOutputs(x_vals)
-        # input("Press Enter to continue...")
-
-        for j in range(0, numFeatures):
-            result[i, j] = x_vals[j]  # insert x_values into result
+    x_vals = np.zeros(shape=[min(chunkSize, numRows), numFeatures], dtype=np.float32)
+    for start in range(0, numRows, chunkSize):
+        stop = min(start + chunkSize, numRows)
+        x_chunk = x_vals[:stop - start]
+        rng.random(dtype=np.float32, out=x_chunk)
+        x_chunk *= x_hi - x_lo
+        x_chunk += x_lo
+        (_, y_vals) = nn.computeOutputsBatch(x_chunk)
 
-        idx = np.argmax(y_vals)  # find the '1' cell
-        t_vals = np.zeros(numClasses, dtype=np.float32)
-        t_vals[idx] = 1.0
-        for j in range(0, numClasses):
-            result[i, j+numFeatures] = t_vals[j]
+        rows = out[start:stop]
+        rows[:, :numFeatures] = x_chunk
+        rows[:, numFeatures:] = 0.0
+        idx = np.argmax(y_vals, axis=1)  # find the '1' cell
+        rows[np.arange(stop - start), numFeatures + idx] = 1.0
 
-    return result
+    return out
 
 
 def splitData(data, trainPct):
     numTrainRows = int(len(data) * trainPct)
-    numTestRows = len(data) - numTrainRows
-    trainData = data[range(0, numTrainRows),]
-    testData = data[range(numTrainRows, len(data)),]
+    # slices are views, nothing is copied
+    trainData = data[:numTrainRows]
+    testData = data[numTrainRows:]
     return (trainData, testData)
 
 
@@ -105,411 +115,391 @@ def showMatrixPartial(m, numRows, dec, indices):
 
 class NeuralNetwork:
 
-    def __init__(self, numInput, numHidden, numOutput, seed):
+    def __init__(self, numInput, numHidden, numOutput, seed, maxBatch=1,
+                 hiddenActivation='tanh', outputActivation='softmax',
+                 loss='meanSquared', optimizer=None, weights=None, precision=None):
         self.ni = numInput
         self.nh = numHidden
         self.no = numOutput
+        # same description as a LayerStack, which shares the weight layout
+        self.layerSizes = [numInput, numHidden, numOutput]
+        self.activations = [hiddenActivation, outputActivation]
+
+        # activation functions by name, see activations.py
+        self.hActivation = activations.get(hiddenActivation)
+        self.oActivation = activations.get(outputActivation)
+
+        # 'meanSquared' or 'crossEntropy', the latter is fused with the
+        # softmax output so the output signals are simply (o-t)
+        if loss not in ('meanSquared', 'crossEntropy'):
+            raise ValueError("unknown loss '%s'" % loss)
+        if loss == 'crossEntropy' and outputActivation.lower() != 'softmax':
+            raise ValueError("crossEntropy loss needs a softmax output activation")
+        self.loss = loss
+
+        # dtypes, see precision.py. Weights and work buffers use the
+        # compute dtype, gradients the accumulate dtype
+        self.precision = policyFor(precision)
+        self.dtype = self.precision.compute
+
+        self.iNodes = np.zeros(shape=[self.ni], dtype=self.dtype)
+
+        # all parameters share one flat buffer, in getWeights() order.
+        # An existing buffer (say a memory-mapped checkpoint) can be
+        # passed as weights, it is used as is and not initialized
+        numWts = self.totalWeights(self.ni, self.nh, self.no)
+        if weights is None:
+            self.bindWeights(np.zeros(shape=[numWts], dtype=self.dtype))
+        else:
+            self.bindWeights(weights)
+
+        # gradients use the same layout as the weights
+        self.grads = np.zeros(shape=[numWts], dtype=self.precision.accumulate)
+        (self.ihGrads, self.hbGrads, self.hoGrads, self.obGrads) = \
+            self.weightViews(self.grads)
 
-        self.iNodes = np.zeros(shape=[self.ni], dtype=np.float32)
-        self.hNodes = np.zeros(shape=[self.nh], dtype=np.float32)
-        self.oNodes = np.zeros(shape=[self.no], dtype=np.float32)
+        # update rule, an optimizers.Optimizer or its name, default SGD
+        self.optimizer = optimizers.create(optimizer)
 
-        self.ihWeights = np.zeros(shape=[self.ni, self.nh], dtype=np.float32)
-        self.hoWeights = np.zeros(shape=[self.nh, self.no], dtype=np.float32)
+        # per phase timing, see profiling.py, off by default
+        self.profiler = profiling.NULL
 
-        self.hBiases = np.zeros(shape=[self.nh], dtype=np.float32)
-        self.oBiases = np.zeros(shape=[self.no], dtype=np.float32)
+        # per row work buffers, grown on demand by resizeWorkspace()
+        self.maxBatch = 0
+        self.resizeWorkspace(maxBatch)
 
         self.rnd = random.Random(seed)  # allows multiple instances
-        self.initializeWeights()
+        if weights is None:
+            self.initializeWeights()
+
+    def weightViews(self, flat):
+        idx = 0
+        ih = flat[idx:idx + self.ni * self.nh].reshape(self.ni, self.nh)
+        idx += self.ni * self.nh
+        hb = flat[idx:idx + self.nh]
+        idx += self.nh
+        ho = flat[idx:idx + self.nh * self.no].reshape(self.nh, self.no)
+        idx += self.nh * self.no
+        ob = flat[idx:idx + self.no]
+        return (ih, hb, ho, ob)
+
+    def bindWeights(self, weights):
+        # ihWeights, hBiases, hoWeights and oBiases become views into
+        # the flat weights buffer, nothing is copied
+        self.weights = weights
+        (self.ihWeights, self.hBiases, self.hoWeights, self.oBiases) = \
+            self.weightViews(weights)
+
+    def __setstate__(self, state):
+        # views into the flat buffers come back from pickle as separate
+        # copies, so point them at the buffers again
+        self.__dict__.update(state)
+        self.bindWeights(self.weights)
+        (self.ihGrads, self.hbGrads, self.hoGrads, self.obGrads) = \
+            self.weightViews(self.grads)
+        maxBatch = self.maxBatch
+        self.maxBatch = 0
+        self.resizeWorkspace(maxBatch)
+
+    def resizeWorkspace(self, maxBatch):
+        # node, signal and batch buffers for up to maxBatch rows
+        if maxBatch <= self.maxBatch:
+            return
+        self.maxBatch = maxBatch
+        self.hNodesBatch = np.zeros(shape=[maxBatch, self.nh], dtype=self.dtype)
+        self.oNodesBatch = np.zeros(shape=[maxBatch, self.no], dtype=self.dtype)
+        self.hSignals = np.zeros(shape=[maxBatch, self.nh], dtype=self.dtype)
+        self.oSignals = np.zeros(shape=[maxBatch, self.no], dtype=self.dtype)
+        self.hDerivatives = np.zeros(shape=[maxBatch, self.nh], dtype=self.dtype)
+        self.oDerivatives = np.zeros(shape=[maxBatch, self.no], dtype=self.dtype)
+        self.rowScratch = np.zeros(shape=[maxBatch, 1], dtype=self.dtype)
+        self.batch = np.zeros(shape=[maxBatch, self.ni + self.no], dtype=self.dtype)
+        # single sample results live in the first row
+        self.hNodes = self.hNodesBatch[0]
+        self.oNodes = self.oNodesBatch[0]
 
     def setWeights(self, weights):
         if len(weights) != self.totalWeights(self.ni, self.nh, self.no):
             print("Warning: len(weights) error in setWeights()")
 
-        idx = 0
-        for i in range(self.ni):
-            for j in range(self.nh):
-                self.ihWeights[i, j] = weights[idx]
-                idx += 1
-
-        for j in range(self.nh):
-            self.hBiases[j] = weights[idx]
-            idx += 1
-
-        for j in range(self.nh):
-            for k in range(self.no):
-                self.hoWeights[j, k] = weights[idx]
-                idx += 1
-
-        for k in range(self.no):
-            self.oBiases[k] = weights[idx]
-            idx += 1
+        self.weights[:] = weights
 
     def getWeights(self):
-        tw = self.totalWeights(self.ni, self.nh, self.no)
-        result = np.zeros(shape=[tw], dtype=np.float32)
-        idx = 0  # points into result
-
-        for i in range(self.ni):
-            for j in range(self.nh):
-                result[idx] = self.ihWeights[i, j]
-                idx += 1
-
-        for j in range(self.nh):
-            result[idx] = self.hBiases[j]
-            idx += 1
-
-        for j in range(self.nh):
-            for k in range(self.no):
-                result[idx] = self.hoWeights[j, k]
-                idx += 1
-
-        for k in range(self.no):
-            result[idx] = self.oBiases[k]
-            idx += 1
-
+        result = self.weights.copy()
         return result
 
     def initializeWeights(self):
         numWts = self.totalWeights(self.ni, self.nh, self.no)
-        wts = np.zeros(shape=[numWts], dtype=np.float32)
         lo = -0.01
         hi = 0.01
-        for idx in range(len(wts)):
-            wts[idx] = (hi - lo) * self.rnd.random() + lo
+        wts = np.fromiter(((hi - lo) * self.rnd.random() + lo
+                           for _ in range(numWts)),
+                          dtype=self.dtype, count=numWts)
         self.setWeights(wts)
 
     def computeOutputs(self, xValues):
-        hSums = np.zeros(shape=[self.nh], dtype=np.float32)
-        oSums = np.zeros(shape=[self.no], dtype=np.float32)
-
-        for i in range(self.ni):
-            self.iNodes[i] = xValues[i]
-
-        for j in range(self.nh):
-            for i in range(self.ni):
-                hSums[j] += self.iNodes[i] * self.ihWeights[i, j]
-
-        for j in range(self.nh):
-            hSums[j] += self.hBiases[j]
-
-        for j in range(self.nh):
-            self.hNodes[j] = self.hypertan(hSums[j])
-
-        for k in range(self.no):
-            for j in range(self.nh):
-                oSums[k] += self.hNodes[j] * self.hoWeights[j, k]
-
-        for k in range(self.no):
-            oSums[k] += self.oBiases[k]
-
-        softOut = self.softmax(oSums)
-        for k in range(self.no):
-            self.oNodes[k] = softOut[k]
-
-        result = np.zeros(shape=self.no, dtype=np.float32)
-        for k in range(self.no):
-            result[k] = self.oNodes[k]
-
-        return result
-
-    def trainOnline(self, trainData, maxEpochs, learnRate):
+        # node values are stored internally, the returned outputs are a
+        # copy of self.oNodes, use computeOutputsBatch to skip the copy
+        self.iNodes[:] = xValues[:self.ni]
+        self.computeOutputsBatch(self.iNodes.reshape(1, self.ni))
+        return self.oNodes.copy()
+
+    def computeOutputsBatch(self, xValues):
+        # forward pass over a whole batch, one sample per row
+        # returns views into the workspace
+        xValues = asCompute(xValues, self.dtype)
+        n = len(xValues)
+        self.resizeWorkspace(n)
+        hNodes = self.hNodesBatch[:n]
+        oNodes = self.oNodesBatch[:n]
+        scratch = self.rowScratch[:n]
+
+        np.matmul(xValues, self.ihWeights, out=hNodes)
+        np.add(hNodes, self.hBiases, out=hNodes)
+        self.hActivation.activate(hNodes, out=hNodes, scratch=scratch)
+
+        np.matmul(hNodes, self.hoWeights, out=oNodes)
+        np.add(oNodes, self.oBiases, out=oNodes)
+        self.oActivation.activate(oNodes, out=oNodes, scratch=scratch)
+
+        return (hNodes, oNodes)
+
+    def computeGradients(self, xValues, tValues, hNodes=None, oNodes=None):
+        # gradients summed over all rows of the batch, written to self.grads
+        # runs the forward pass first when no node values are given
+        profiler = self.profiler
+        xValues = asCompute(xValues, self.dtype)
+        tValues = asCompute(tValues, self.dtype)
+        if hNodes is None:
+            (hNodes, oNodes) = self.computeOutputsBatch(xValues)
+            profiler.mark(profiling.ACTIVATION)
+        n = len(xValues)
+        oSignals = self.oSignals[:n]
+        hSignals = self.hSignals[:n]
+        oDerivatives = self.oDerivatives[:n]
+        hDerivatives = self.hDerivatives[:n]
+
+        # 1. compute output node signals
+        if self.loss == 'crossEntropy':
+            # softmax + cross-entropy, the softmax Jacobian cancels
+            # against the log so the signals are just (o-t)
+            np.subtract(oNodes, tValues, out=oSignals)
+        else:
+            # output activation derivative, E=(t-o)^2 so E'=(o-t)
+            self.oActivation.differentiate(oNodes, out=oDerivatives)
+            np.subtract(oNodes, tValues, out=oSignals)
+            np.multiply(oSignals, oDerivatives, out=oSignals)
+        profiler.mark(profiling.DELTA)
+
+        # 2. & 3. hidden-to-output weight and output bias gradients
+        # summed in the accumulate dtype, see precision.py
+        accumulate = self.precision.accumulate
+        np.matmul(hNodes.T, oSignals, out=self.hoGrads, dtype=accumulate)
+        np.sum(oSignals, axis=0, out=self.obGrads, dtype=accumulate)
+        profiler.mark(profiling.GRADIENT)
+
+        # 4. compute hidden node signals, hidden activation derivative
+        self.hActivation.differentiate(hNodes, out=hDerivatives)
+        np.matmul(oSignals, self.hoWeights.T, out=hSignals)
+        np.multiply(hSignals, hDerivatives, out=hSignals)
+        profiler.mark(profiling.DELTA)
+
+        # 5. & 6. input-to-hidden weight and hidden bias gradients
+        np.matmul(xValues.T, hSignals, out=self.ihGrads, dtype=accumulate)
+        np.sum(hSignals, axis=0, out=self.hbGrads, dtype=accumulate)
+        profiler.mark(profiling.GRADIENT)
+
+        return self.grads
+
+    def updateWeights(self, grads, learnRate):
+        self.optimizer.step(self.weights, grads, learnRate)
+
+    def trainOnline(self, trainData, maxEpochs, learnRate, callbacks=None, verbose=True):
         # online with tanh + softmax & error
-        # hidden-to-output weights gradients
-        hoGrads = np.zeros(shape=[self.nh, self.no], dtype=np.float32)
-        # output node biases gradients
-        obGrads = np.zeros(shape=[self.no], dtype=np.float32)
-        # input-to-hidden weights gradients
-        ihGrads = np.zeros(shape=[self.ni, self.nh], dtype=np.float32)
-        # hidden biases gradients
-        hbGrads = np.zeros(shape=[self.nh], dtype=np.float32)
-
-        # output signals: gradients w/o assoc. input terms
-        oSignals = np.zeros(shape=[self.no], dtype=np.float32)
-        # hidden signals: gradients w/o assoc. input terms
-        hSignals = np.zeros(shape=[self.nh], dtype=np.float32)
-
         epoch = 0
-        x_values = np.zeros(shape=[self.ni], dtype=np.float32)
-        t_values = np.zeros(shape=[self.no], dtype=np.float32)
         numTrainItems = len(trainData)
         # [0, 1, 2, . . n-1]  # rnd.shuffle(v)
         indices = np.arange(numTrainItems)
+        trainData = asCompute(trainData, self.dtype)  # once, not per row
+
+        profiler = self.profiler
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self, logs)
 
         while epoch < maxEpochs:
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
             self.rnd.shuffle(indices)  # scramble order of training items
             for ii in range(numTrainItems):
+                profiler.begin()
                 idx = indices[ii]
+                # single row batches, sliced so no copy is made
+                x_values = trainData[idx:idx+1, :self.ni]
+                t_values = trainData[idx:idx+1, self.ni:self.ni+self.no]
+                profiler.mark(profiling.LOAD)
 
-                for j in range(self.ni):
-                    x_values[j] = trainData[idx, j]  # get the input values
-                for j in range(self.no):
-                    # get the target values
-                    t_values[j] = trainData[idx, j+self.ni]
-                self.computeOutputs(x_values)  # results stored internally
-
-                # 1. compute output node signals
-                for k in range(self.no):
-                    derivative = (1 - self.oNodes[k]) * \
-                        self.oNodes[k]  # softmax
-                    # E=(t-o)^2 do E'=(o-t)
-                    oSignals[k] = derivative * (self.oNodes[k] - t_values[k])
-
-                # 2. compute hidden-to-output weight gradients using output signals
-                for j in range(self.nh):
-                    for k in range(self.no):
-                        hoGrads[j, k] = oSignals[k] * self.hNodes[j]
-
-                # 3. compute output node bias gradients using output signals
-                for k in range(self.no):
-                    # 1.0 dummy input can be dropped
-                    obGrads[k] = oSignals[k] * 1.0
-
-                # 4. compute hidden node signals
-                for j in range(self.nh):
-                    sum = 0.0
-                    for k in range(self.no):
-                        sum += oSignals[k] * self.hoWeights[j, k]
-                    # tanh activation
-                    derivative = (1 - self.hNodes[j]) * (1 + self.hNodes[j])
-                    hSignals[j] = derivative * sum
-
-                # 5 compute input-to-hidden weight gradients using hidden signals
-                for i in range(self.ni):
-                    for j in range(self.nh):
-                        ihGrads[i, j] = hSignals[j] * self.iNodes[i]
-
-                # 6. compute hidden node bias gradients using hidden signals
-                for j in range(self.nh):
-                    # 1.0 dummy input can be dropped
-                    hbGrads[j] = hSignals[j] * 1.0
-
-                # update weights and biases using the gradients
-
-                # 1. update input-to-hidden weights
-                for i in range(self.ni):
-                    for j in range(self.nh):
-                        delta = -1.0 * learnRate * ihGrads[i, j]
-                        self.ihWeights[i, j] += delta
-
-                # 2. update hidden node biases
-                for j in range(self.nh):
-                    delta = -1.0 * learnRate * hbGrads[j]
-                    self.hBiases[j] += delta
-
-                # 3. update hidden-to-output weights
-                for j in range(self.nh):
-                    for k in range(self.no):
-                        delta = -1.0 * learnRate * hoGrads[j, k]
-                        self.hoWeights[j, k] += delta
-
-                # 4. update output node biases
-                for k in range(self.no):
-                    delta = -1.0 * learnRate * obGrads[k]
-                    self.oBiases[k] += delta
+                (hNodes, oNodes) = self.computeOutputsBatch(x_values)
+                profiler.mark(profiling.ACTIVATION)
+                grads = self.computeGradients(x_values, t_values, hNodes, oNodes)
+                self.updateWeights(grads, learnRate)
+                profiler.mark(profiling.UPDATE)
 
             epoch += 1
 
-            if epoch % 25 == 0:
+            if verbose and epoch % 25 == 0:
+                profiler.begin()
                 mse = self.meanSquaredError(trainData)
                 print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+                profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
 
         # end while
 
+        callbackList.trainEnd(logs)
         result = self.getWeights()
         return result
     # end trainOnline
 
     # ----------------
 
-    def trainBatch(self, trainData, maxEpochs, learnRate):
+    def trainBatch(self, trainData, maxEpochs, learnRate, callbacks=None, verbose=True):
         # full batch with tanh + softmax & ms error
         # this version accumulates gradients instead of deltas
-
-        # hidden-to-output weights gradients
-        hoGrads = np.zeros(shape=[self.nh, self.no], dtype=np.float32)
-        # output node biases gradients
-        obGrads = np.zeros(shape=[self.no], dtype=np.float32)
-        # input-to-hidden weights gradients
-        ihGrads = np.zeros(shape=[self.ni, self.nh], dtype=np.float32)
-        # hidden biases gradients
-        hbGrads = np.zeros(shape=[self.nh], dtype=np.float32)
-
-        # output signals: gradients w/o assoc. input terms
-        oSignals = np.zeros(shape=[self.no], dtype=np.float32)
-        # hidden signals: gradients w/o assoc. input terms
-        hSignals = np.zeros(shape=[self.nh], dtype=np.float32)
-
         epoch = 0
-        x_values = np.zeros(shape=[self.ni], dtype=np.float32)
-        t_values = np.zeros(shape=[self.no], dtype=np.float32)
-        numTrainItems = len(trainData)
-        # [0, 1, 2, . . n-1]  # rnd.shuffle(v)
-        indices = np.arange(numTrainItems)
+        trainData = asCompute(trainData, self.dtype)
+        x_values = trainData[:, :self.ni]
+        t_values = trainData[:, self.ni:self.ni+self.no]
+
+        profiler = self.profiler
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self, logs)
 
         while epoch < maxEpochs:
-            # self.rnd.shuffle(indices)  # scramble order of training items -- not necessary for full-batch
-            # zero-out batch training accumulated weight and bias gradients
-            # input-to-hidden weights accumulated grads
-            ihWtsAccGrads = np.zeros(
-                shape=[self.ni, self.nh], dtype=np.float32)
-            # hidden biases accumulated grads
-            hBiasesAccGrads = np.zeros(shape=[self.nh], dtype=np.float32)
-            hoWtsAccGrads = np.zeros(
-                shape=[self.nh, self.no], dtype=np.float32)  # hidden-to-output
-            oBiasesAccGrads = np.zeros(
-                shape=[self.no], dtype=np.float32)  # output node biases
-
-            # visit each item, accumulate weight grads but don't update
-            for ii in range(numTrainItems):
-                idx = indices[ii]  # note these are unscrambled
-
-                for j in range(self.ni):
-                    x_values[j] = trainData[idx, j]  # get the input values
-                for j in range(self.no):
-                    # get the target values
-                    t_values[j] = trainData[idx, j+self.ni]
-                self.computeOutputs(x_values)  # results stored internally
-
-                # 1. compute output node signals
-                for k in range(self.no):
-                    derivative = (1 - self.oNodes[k]) * \
-                        self.oNodes[k]  # softmax
-                    # E=(t-o)^2 do E'=(o-t)
-                    oSignals[k] = derivative * (self.oNodes[k] - t_values[k])
-
-                # 2. compute hidden-to-output weight grads and accumulate
-                for j in range(self.nh):
-                    for k in range(self.no):
-                        hoGrads[j, k] = oSignals[k] * self.hNodes[j]
-                        hoWtsAccGrads[j, k] += hoGrads[j, k]
-
-                # 3. compute and accumulate output node bias gradients
-                for k in range(self.no):
-                    # 1.0 dummy input can be dropped
-                    obGrads[k] = oSignals[k] * 1.0
-                    oBiasesAccGrads[k] += obGrads[k]
-
-                # 4. compute hidden node signals
-                for j in range(self.nh):
-                    sum = 0.0
-                    for k in range(self.no):
-                        sum += oSignals[k] * self.hoWeights[j, k]
-                    # tanh activation
-                    derivative = (1 - self.hNodes[j]) * (1 + self.hNodes[j])
-                    hSignals[j] = derivative * sum
-
-                # 5 compute and accumulate input-to-hidden weight gradients using hidden signals
-                for i in range(self.ni):
-                    for j in range(self.nh):
-                        ihGrads[i, j] = hSignals[j] * self.iNodes[i]
-                        ihWtsAccGrads[i, j] += ihGrads[i, j]
-
-                # 6. compute and accumulate hidden node bias gradients using hidden signals
-                for j in range(self.nh):
-                    # 1.0 dummy input can be dropped
-                    hbGrads[j] = hSignals[j] * 1.0
-                    hBiasesAccGrads[j] += hbGrads[j]
-
-            # end-for (all training items)
-
-            # now do the updates - calculate deltas using accumulated gradients
-            # 1. update input-to-hidden weights
-            for i in range(self.ni):
-                for j in range(self.nh):
-                    delta = -1.0 * learnRate * ihWtsAccGrads[i, j]
-                    self.ihWeights[i, j] += delta
-
-            # 2. update hidden node biases
-            for j in range(self.nh):
-                delta = -1.0 * learnRate * hBiasesAccGrads[j]
-                self.hBiases[j] += delta
-
-            # 3. update hidden-to-output weights
-            for j in range(self.nh):
-                for k in range(self.no):
-                    delta = -1.0 * learnRate * hoWtsAccGrads[j, k]
-                    self.hoWeights[j, k] += delta
-
-            # 4. update output node biases
-            for k in range(self.no):
-                delta = -1.0 * learnRate * oBiasesAccGrads[k]
-                self.oBiases[k] += delta
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
+            # shuffling is not necessary for full-batch, the whole training
+            # set is one matrix product and the gradients come out summed
+            profiler.begin()
+            (hNodes, oNodes) = self.computeOutputsBatch(x_values)
+            profiler.mark(profiling.ACTIVATION)
+            grads = self.computeGradients(x_values, t_values, hNodes, oNodes)
+            self.updateWeights(grads, learnRate)
+            profiler.mark(profiling.UPDATE)
 
             epoch += 1
 
-            if epoch % 25 == 0:
+            if verbose and epoch % 25 == 0:
+                profiler.begin()
                 mse = self.meanSquaredError(trainData)
                 print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+                profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
 
         # end while
 
+        callbackList.trainEnd(logs)
         result = self.getWeights()
         return result
     # end trainBatch
 
-    def accuracy(self, tdata):  # train or test data matrix
-        num_correct = 0
-        num_wrong = 0
-        x_values = np.zeros(shape=[self.ni], dtype=np.float32)
-        t_values = np.zeros(shape=[self.no], dtype=np.float32)
+    # ----------------
 
-        for i in range(len(tdata)):  # walk thru each data item
-            for j in range(self.ni):  # peel off input values from curr data row
-                x_values[j] = tdata[i, j]
-            for j in range(self.no):  # peel off tareget values from curr data row
-                t_values[j] = tdata[i, j+self.ni]
+    def trainMiniBatch(self, trainData, maxEpochs, learnRate, batchSize, callbacks=None,
+                       verbose=True):
+        # mini-batch with tanh + softmax & ms error
+        # gradients are summed per batch like trainBatch, so batchSize=1
+        # behaves like trainOnline and batchSize=len(trainData) like trainBatch
+        epoch = 0
+        numTrainItems = len(trainData)
+        indices = np.arange(numTrainItems)
+        self.resizeWorkspace(min(batchSize, numTrainItems))
+        trainData = asCompute(trainData, self.dtype)
 
-            y_values = self.computeOutputs(x_values)  # computed output values)
-            max_index = np.argmax(y_values)  # index of largest output value
+        profiler = self.profiler
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self, logs)
 
-            if abs(t_values[max_index] - 1.0) < 1.0e-5:
-                num_correct += 1
-            else:
-                num_wrong += 1
+        while epoch < maxEpochs:
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
+            self.rnd.shuffle(indices)  # scramble order once per epoch
+            for start in range(0, numTrainItems, batchSize):
+                # one gather per batch into the workspace,
+                # then one matrix product per layer
+                profiler.begin()
+                batchIndices = indices[start:start+batchSize]
+                batch = self.batch[:len(batchIndices)]
+                np.take(trainData, batchIndices, axis=0, out=batch)
+                x_values = batch[:, :self.ni]
+                t_values = batch[:, self.ni:self.ni+self.no]
+                profiler.mark(profiling.LOAD)
+
+                (hNodes, oNodes) = self.computeOutputsBatch(x_values)
+                profiler.mark(profiling.ACTIVATION)
+                grads = self.computeGradients(x_values, t_values, hNodes, oNodes)
+                self.updateWeights(grads, learnRate)
+                profiler.mark(profiling.UPDATE)
 
-        return (num_correct * 1.0) / (num_correct + num_wrong)
+            epoch += 1
 
-    def meanSquaredError(self, tdata):  # on train or test data matrix
-        sumSquaredError = 0.0
-        x_values = np.zeros(shape=[self.ni], dtype=np.float32)
-        t_values = np.zeros(shape=[self.no], dtype=np.float32)
+            if verbose and epoch % 25 == 0:
+                profiler.begin()
+                mse = self.meanSquaredError(trainData)
+                print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+                profiler.mark(profiling.EVALUATE)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
 
-        for ii in range(len(tdata)):  # walk thru each data item
-            for jj in range(self.ni):  # peel off input values from curr data row
-                x_values[jj] = tdata[ii, jj]
-            for jj in range(self.no):  # peel off tareget values from curr data row
-                t_values[jj] = tdata[ii, jj+self.ni]
+        # end while
+
+        callbackList.trainEnd(logs)
+        result = self.getWeights()
+        return result
+    # end trainMiniBatch
 
-            y_values = self.computeOutputs(x_values)  # computed output values
+    def evaluate(self, tdata, chunkSize=metrics.DEFAULT_CHUNK_SIZE):
+        # accuracy, ms error and confusion matrix from one batched pass
+        return metrics.evaluate(lambda x: self.computeOutputsBatch(x)[1],
+                                tdata[:, :self.ni],
+                                tdata[:, self.ni:self.ni+self.no], chunkSize)
 
-            for j in range(self.no):
-                # target - output to be consistent
-                err = t_values[j] - y_values[j]
-                sumSquaredError += err * err  # (t-o)^2
+    def accuracy(self, tdata):  # train or test data matrix
+        return self.evaluate(tdata).accuracy
 
-        return sumSquaredError / len(tdata)
+    def meanSquaredError(self, tdata):  # on train or test data matrix
+        return self.evaluate(tdata).meanSquaredError
+
+    def crossEntropyError(self, tdata, chunkSize=metrics.DEFAULT_CHUNK_SIZE):
+        # mean softmax cross-entropy, from the output sums via log-sum-exp
+        sumError = 0.0
+        for start in range(0, len(tdata), chunkSize):
+            rows = tdata[start:start+chunkSize]
+            (hNodes, _) = self.computeOutputsBatch(rows[:, :self.ni])
+            oSums = hNodes @ self.hoWeights + self.oBiases
+            sumError += metrics.crossEntropy(oSums, rows[:, self.ni:self.ni+self.no])
+        return sumError / len(tdata)
 
     @staticmethod
     def hypertan(x):
-        if x < -20.0:
-            return -1.0
-        elif x > 20.0:
-            return 1.0
-        else:
-            return math.tanh(x)
+        return activations.get('tanh').activate(np.asarray(x, dtype=getDefault().compute))
 
     @staticmethod
     def softmax(oSums):
-        result = np.zeros(shape=[len(oSums)], dtype=np.float32)
-        m = max(oSums)
-        divisor = 0.0
-        for k in range(len(oSums)):
-            divisor += math.exp(oSums[k] - m)
-        for k in range(len(result)):
-            result[k] = math.exp(oSums[k] - m) / divisor
-        return result
+        return activations.get('softmax').activate(np.asarray(oSums, dtype=getDefault().compute))
 
     @staticmethod
     def totalWeights(nInput, nHidden, nOutput):
@@ -573,6 +563,43 @@ def main():
     print("Accuracy on train data = %0.4f " % accTrain)
     print("Accuracy on test data  = %0.4f " % accTest)
 
+    print("-------------")
+
+    print("\nRe-creating a %d-%d-%d neural network " %
+          (numInput, numHidden, numOutput))
+    nn = NeuralNetwork(numInput, numHidden, numOutput, seed=13)
+
+    batchSize = 16
+    print("Setting batch size = " + str(batchSize))
+
+    print("Starting training (mini-batch)")
+    nn.trainMiniBatch(trainData, maxEpochs, learnRate, batchSize)
+    print("Training complete")
+
+    accTrain = nn.accuracy(trainData)
+    accTest = nn.accuracy(testData)
+
+    print("Accuracy on train data = %0.4f " % accTrain)
+    print("Accuracy on test data  = %0.4f " % accTest)
+
+    print("-------------")
+
+    print("\nRe-creating a %d-%d-%d neural network, cross-entropy loss " %
+          (numInput, numHidden, numOutput))
+    nn = NeuralNetwork(numInput, numHidden, numOutput, seed=13,
+                       maxBatch=batchSize, loss='crossEntropy')
+
+    print("Starting training (mini-batch)")
+    nn.trainMiniBatch(trainData, maxEpochs, learnRate, batchSize)
+    print("Training complete")
+
+    accTrain = nn.accuracy(trainData)
+    accTest = nn.accuracy(testData)
+
+    print("Accuracy on train data = %0.4f " % accTrain)
+    print("Accuracy on test data  = %0.4f " % accTest)
+    print("Cross-entropy on test data = %0.4f " % nn.crossEntropyError(testData))
+
     print("\nEnd demo ")
 
 
@@ -0,0 +1,261 @@
+# optimizers.py
+# Python 3.x
+
+import math
+
+import numpy as np
+
+# Update rules for the flat parameter buffers of nn3 and LayerStack.
+#
+# step(weights, grads, learnRate) moves weights against grads in place.
+# Any per parameter state (velocities, moving averages) is kept in arrays
+# with the same length and dtype as the weights, allocated on the first
+# step and reused after that, so an update does not allocate. The learn
+# rate is passed on every step rather than stored, which lets a training
+# loop change it between steps.
+#
+# Models hold their optimizer in .optimizer and call it from
+# updateWeights(); look one up by name with get().
+
+
+class Optimizer:
+    def __init__(self):
+        self.numParams = 0
+        self.scratch = None
+
+    def bind(self, numParams, dtype=np.float32):
+        # (re)allocate state for numParams parameters, clears it
+        self.numParams = numParams
+        self.scratch = np.zeros(shape=[numParams], dtype=dtype)
+        self.allocate(numParams, dtype)
+
+    def allocate(self, numParams, dtype):
+        pass
+
+    def reset(self):
+        if self.numParams:
+            self.bind(self.numParams, self.scratch.dtype)
+
+    def config(self):
+        # constructor arguments, get(type name, **config) rebuilds it
+        return {}
+
+    def state(self):
+        # name -> array or number, everything needed to resume training
+        return {}
+
+    def setState(self, numParams, state, dtype=np.float32):
+        # inverse of state(), arrays are copied into fresh buffers
+        self.bind(numParams, dtype)
+        for (name, value) in state.items():
+            if isinstance(value, np.ndarray):
+                getattr(self, name)[:] = value
+            else:
+                setattr(self, name, value)
+
+    def step(self, weights, grads, learnRate):
+        if self.numParams != len(weights) or self.scratch.dtype != weights.dtype:
+            self.bind(len(weights), weights.dtype)
+        self.update(weights, grads, learnRate, self.scratch)
+
+    def update(self, weights, grads, learnRate, scratch):
+        raise NotImplementedError
+
+
+class SGD(Optimizer):
+    # w = w - lr * g
+    def update(self, weights, grads, learnRate, scratch):
+        np.multiply(grads, learnRate, out=scratch)
+        np.subtract(weights, scratch, out=weights)
+
+
+class Momentum(Optimizer):
+    # v = mu * v + g
+    # w = w - lr * v, or w - lr * (g + mu * v) with nesterov
+    def __init__(self, momentum=0.9, nesterov=False):
+        Optimizer.__init__(self)
+        self.momentum = momentum
+        self.nesterov = nesterov
+        self.velocity = None
+
+    def config(self):
+        return {'momentum': self.momentum, 'nesterov': self.nesterov}
+
+    def allocate(self, numParams, dtype):
+        self.velocity = np.zeros(shape=[numParams], dtype=dtype)
+
+    def state(self):
+        return {'velocity': self.velocity}
+
+    def update(self, weights, grads, learnRate, scratch):
+        v = self.velocity
+        np.multiply(v, self.momentum, out=v)
+        np.add(v, grads, out=v)
+        if self.nesterov:
+            np.multiply(v, self.momentum, out=scratch)
+            np.add(scratch, grads, out=scratch)
+            np.multiply(scratch, learnRate, out=scratch)
+        else:
+            np.multiply(v, learnRate, out=scratch)
+        np.subtract(weights, scratch, out=weights)
+
+
+class Nesterov(Momentum):
+    def __init__(self, momentum=0.9):
+        Momentum.__init__(self, momentum, nesterov=True)
+
+    def config(self):
+        return {'momentum': self.momentum}
+
+
+class RMSProp(Optimizer):
+    # s = rho * s + (1 - rho) * g^2
+    # w = w - lr * g / (sqrt(s) + eps)
+    def __init__(self, decay=0.9, epsilon=1.0e-7):
+        Optimizer.__init__(self)
+        self.decay = decay
+        self.epsilon = epsilon
+        self.meanSquare = None
+
+    def config(self):
+        return {'decay': self.decay, 'epsilon': self.epsilon}
+
+    def allocate(self, numParams, dtype):
+        self.meanSquare = np.zeros(shape=[numParams], dtype=dtype)
+
+    def state(self):
+        return {'meanSquare': self.meanSquare}
+
+    def update(self, weights, grads, learnRate, scratch):
+        s = self.meanSquare
+        # s += (1 - rho) * (g^2 - s)
+        np.square(grads, out=scratch)
+        np.subtract(scratch, s, out=scratch)
+        np.multiply(scratch, 1.0 - self.decay, out=scratch)
+        np.add(s, scratch, out=s)
+
+        np.sqrt(s, out=scratch)
+        np.add(scratch, self.epsilon, out=scratch)
+        np.divide(grads, scratch, out=scratch)
+        np.multiply(scratch, learnRate, out=scratch)
+        np.subtract(weights, scratch, out=weights)
+
+
+class Adam(Optimizer):
+    # m = b1 * m + (1 - b1) * g
+    # v = b2 * v + (1 - b2) * g^2
+    # w = w - lr * mhat / (sqrt(vhat) + eps), bias corrections folded
+    # into the step size
+    def __init__(self, beta1=0.9, beta2=0.999, epsilon=1.0e-8):
+        Optimizer.__init__(self)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+        self.mean = None
+        self.variance = None
+        self.t = 0
+
+    def config(self):
+        return {'beta1': self.beta1, 'beta2': self.beta2, 'epsilon': self.epsilon}
+
+    def allocate(self, numParams, dtype):
+        self.mean = np.zeros(shape=[numParams], dtype=dtype)
+        self.variance = np.zeros(shape=[numParams], dtype=dtype)
+        self.t = 0
+
+    def state(self):
+        return {'mean': self.mean, 'variance': self.variance, 't': self.t}
+
+    def update(self, weights, grads, learnRate, scratch):
+        (m, v) = (self.mean, self.variance)
+        self.t += 1
+
+        # m += (1 - b1) * (g - m)
+        np.subtract(grads, m, out=scratch)
+        np.multiply(scratch, 1.0 - self.beta1, out=scratch)
+        np.add(m, scratch, out=m)
+        # v += (1 - b2) * (g^2 - v)
+        np.square(grads, out=scratch)
+        np.subtract(scratch, v, out=scratch)
+        np.multiply(scratch, 1.0 - self.beta2, out=scratch)
+        np.add(v, scratch, out=v)
+
+        stepSize = (learnRate * math.sqrt(1.0 - self.beta2 ** self.t) /
+                    (1.0 - self.beta1 ** self.t))
+        np.sqrt(v, out=scratch)
+        np.add(scratch, self.epsilon, out=scratch)
+        np.divide(m, scratch, out=scratch)
+        np.multiply(scratch, stepSize, out=scratch)
+        np.subtract(weights, scratch, out=weights)
+
+
+_optimizers = {}
+
+
+def register(name, optimizerClass):
+    _optimizers[name.lower()] = optimizerClass
+
+
+def get(name, **kwargs):
+    # a new optimizer, state is per model so instances are not shared
+    try:
+        optimizerClass = _optimizers[name.lower()]
+    except KeyError:
+        raise ValueError("unknown optimizer '%s', expected one of %s" %
+                         (name, ", ".join(sorted(_optimizers)))) from None
+    return optimizerClass(**kwargs)
+
+
+def names():
+    return sorted(_optimizers)
+
+
+def create(optimizer):
+    # None -> SGD, a name -> get(name), an Optimizer is used as is
+    if optimizer is None:
+        return SGD()
+    if isinstance(optimizer, str):
+        return get(optimizer)
+    return optimizer
+
+
+register('SGD', SGD)
+register('Momentum', Momentum)
+register('Nesterov', Nesterov)
+register('RMSProp', RMSProp)
+register('Adam', Adam)
+
+
+def main():
+    import nn3
+
+    print("\nBegin optimizer comparison \n")
+
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+
+    maxEpochs = 100
+    batchSize = 16
+    targetError = 0.05
+    print("4-7-3 network, mini-batch size " + str(batchSize) +
+          ", epochs to reach ms error " + str(targetError) + "\n")
+    print("optimizer  learn rate  epochs  final ms error  test accuracy")
+    for (name, learnRate) in (('SGD', 0.01), ('Momentum', 0.01), ('Nesterov', 0.01),
+                              ('RMSProp', 0.005), ('Adam', 0.01)):
+        nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=batchSize, optimizer=name)
+        epochsToTarget = None
+        for epoch in range(1, maxEpochs + 1):
+            nn.trainMiniBatch(trainData, 1, learnRate, batchSize)
+            mse = nn.meanSquaredError(trainData)
+            if epochsToTarget is None and mse <= targetError:
+                epochsToTarget = epoch
+        print("%-9s  %10.3f  %6s  %14.4f  %13.4f" %
+              (name, learnRate, epochsToTarget or "-", mse, nn.accuracy(testData)))
+
+    print("\nEnd comparison ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
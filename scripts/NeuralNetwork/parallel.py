@@ -0,0 +1,238 @@
+# parallel.py
+# Python 3.x
+
+import multiprocessing as mp
+import os
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from callbacks import CallbackList
+import nn3
+import layerstack
+
+# Data parallel training over a multiprocessing pool.
+#
+# The training matrix, the shuffled index vector and the model's flat
+# weights live in shared memory. Every batch is split into one shard per
+# worker; each worker gathers its rows, computes summed gradients with its
+# own copy of the model and writes them to its row of a shared gradient
+# matrix. The parent then reduces the rows into model.grads and applies a
+# single update, so a step gives the same weights as the serial trainer.
+#
+# Works with any model exposing the nn3 / LayerStack training interface:
+# weights, grads, bindWeights, resizeWorkspace, batch, computeGradients
+# and updateWeights.
+
+# per process state, filled in by _initWorker
+_worker = {}
+
+
+def _sharedArray(shape, dtype, source=None):
+    size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    if source is not None:
+        array[:] = source
+    return (shm, array)
+
+
+def _release(pool, model, segments):
+    # stops the pool and frees the shared blocks, for close() and for a
+    # trainer that is garbage collected or still open at exit
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    if any(np.shares_memory(model.weights, np.frombuffer(shm.buf, np.uint8)) for shm in segments):
+        # hand the model a private copy before the shared block goes away
+        model.bindWeights(model.weights.copy())
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass  # an array still points into it, the mapping goes with the process
+        shm.unlink()
+    segments.clear()
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _initWorker(model, specs):
+    arrays = {}
+    for (key, (name, shape, dtype)) in specs.items():
+        (shm, arrays[key]) = _attach(name, shape, dtype)
+        _worker[key + 'Shm'] = shm  # keep the mapping alive
+    model.bindWeights(arrays['weights'])
+    _worker['model'] = model
+    _worker.update(arrays)
+
+
+def _workerGradients(task):
+    (shard, start, stop) = task
+    model = _worker['model']
+    indices = _worker['indices'][start:stop]
+    n = len(indices)
+    grads = _worker['grads'][shard]
+    if n == 0:
+        grads.fill(0.0)
+        return shard
+
+    model.resizeWorkspace(n)
+    batch = model.batch[:n]
+    np.take(_worker['data'], indices, axis=0, out=batch)
+    model.computeGradients(batch[:, :model.ni], batch[:, model.ni:model.ni+model.no])
+    np.copyto(grads, model.grads)
+    return shard
+
+
+class DataParallelTrainer:
+
+    def __init__(self, model, trainData, numWorkers=None):
+        self.model = model
+        self.numWorkers = numWorkers or os.cpu_count() or 1
+        self.numTrainItems = len(trainData)
+
+        # data and weights in the model's compute dtype, gradients in its
+        # accumulate dtype (see precision.py)
+        dtype = model.weights.dtype
+        gradsDtype = model.grads.dtype
+        trainData = np.ascontiguousarray(trainData, dtype=dtype)
+        # every block goes into segments as soon as it exists, so a
+        # failure part way unlinks the ones already made
+        self.segments = []
+        self.pool = None
+        try:
+            (self.dataShm, self.data) = self.share(trainData.shape, dtype, trainData)
+            (self.indicesShm, self.indices) = self.share(
+                [self.numTrainItems], np.int64, np.arange(self.numTrainItems))
+            (self.weightsShm, weights) = self.share(
+                model.weights.shape, dtype, model.weights)
+            (self.gradsShm, self.grads) = self.share(
+                [self.numWorkers, len(model.weights)], gradsDtype)
+            model.bindWeights(weights)  # parent updates the shared weights in place
+
+            specs = {
+                'data': (self.dataShm.name, self.data.shape, dtype),
+                'indices': (self.indicesShm.name, self.indices.shape, np.int64),
+                'weights': (self.weightsShm.name, weights.shape, dtype),
+                'grads': (self.gradsShm.name, self.grads.shape, gradsDtype),
+            }
+            self.pool = mp.Pool(self.numWorkers, initializer=_initWorker,
+                                initargs=(model, specs))
+        except BaseException:
+            _release(self.pool, model, self.segments)
+            raise
+        # frees the pool and the blocks if the trainer is dropped or still
+        # open at exit without close()
+        self.finalizer = weakref.finalize(self, _release, self.pool, model, self.segments)
+
+    def share(self, shape, dtype, source=None):
+        (shm, array) = _sharedArray(shape, dtype, source)
+        self.segments.append(shm)
+        return (shm, array)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        self.data = self.indices = self.grads = None
+        self.finalizer()
+
+    def step(self, start, stop, learnRate):
+        # one synchronous update from indices[start:stop]
+        bounds = np.linspace(start, stop, self.numWorkers + 1).astype(np.int64)
+        tasks = [(w, int(bounds[w]), int(bounds[w+1])) for w in range(self.numWorkers)]
+        self.pool.map(_workerGradients, tasks, chunksize=1)
+        # all-reduce: sum the per shard gradients, then one update
+        np.sum(self.grads, axis=0, out=self.model.grads)
+        self.model.updateWeights(self.model.grads, learnRate)
+
+    def trainMiniBatch(self, maxEpochs, learnRate, batchSize, callbacks=None, verbose=True):
+        # same schedule as model.trainMiniBatch, shuffled with model.rnd
+        epoch = 0
+        callbackList = CallbackList(callbacks)
+        logs = {'learnRate': learnRate}
+        callbackList.trainBegin(self.model, logs)
+
+        while epoch < maxEpochs:
+            callbackList.epochBegin(epoch, logs)
+            learnRate = logs['learnRate']
+            self.model.rnd.shuffle(self.indices)
+            for start in range(0, self.numTrainItems, batchSize):
+                self.step(start, min(start + batchSize, self.numTrainItems), learnRate)
+
+            epoch += 1
+
+            if verbose and epoch % 25 == 0:
+                mse = self.model.meanSquaredError(self.data)
+                print("epoch = " + str(epoch) + " ms error = %0.4f " % mse)
+
+            logs['epoch'] = epoch
+            callbackList.epochEnd(epoch, logs)
+            if logs.get('stop'):
+                break
+
+        callbackList.trainEnd(logs)
+        result = self.model.getWeights()
+        return result
+
+    def trainBatch(self, maxEpochs, learnRate, callbacks=None, verbose=True):
+        return self.trainMiniBatch(maxEpochs, learnRate, self.numTrainItems, callbacks, verbose)
+
+# end class DataParallelTrainer
+
+
+def main():
+    # throughput benchmark, run with OPENBLAS_NUM_THREADS=1 (or the
+    # equivalent for your BLAS) so each worker stays on one core
+    print("\nBegin data parallel benchmark \n")
+
+    numRows = 50000
+    layerSizes = [32, 256, 256, 10]
+    activationNames = ['tanh', 'tanh', 'softmax']
+    batchSize = 4096
+    maxEpochs = 2
+    learnRate = 0.0005
+
+    print("Generating " + str(numRows) + " rows of synthetic data")
+    allData = nn3.makeData(layerSizes[0], 16, layerSizes[-1], numRows, nn_seed=1)
+    print("Network " + "-".join(str(n) for n in layerSizes) +
+          ", batch size " + str(batchSize) + "\n")
+
+    maxWorkers = os.cpu_count() or 1
+    workerCounts = sorted(set([1, 2, 4, 8, maxWorkers]))
+    baseline = None
+    print("workers   samples/sec   speedup")
+    for numWorkers in workerCounts:
+        if numWorkers > maxWorkers:
+            continue
+        nn = layerstack.LayerStack(layerSizes, activationNames, seed=13)
+        with DataParallelTrainer(nn, allData, numWorkers) as trainer:
+            trainer.trainMiniBatch(1, learnRate, batchSize)  # warm up
+            start = time.perf_counter()
+            trainer.trainMiniBatch(maxEpochs, learnRate, batchSize)
+            elapsed = time.perf_counter() - start
+        rate = numRows * maxEpochs / elapsed
+        baseline = baseline or rate
+        print("%7d   %11.0f   %6.2fx" % (numWorkers, rate, rate / baseline))
+
+    print("\nEnd benchmark ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
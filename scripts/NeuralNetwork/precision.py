@@ -0,0 +1,116 @@
+# precision.py
+# Python 3.x
+
+import collections
+
+import numpy as np
+
+# Floating point policy for the Python models.
+#
+# A Policy names three dtypes:
+#   compute     parameters, activations, signals and work buffers
+#   storage     parameters as written to checkpoints
+#   accumulate  gradient sums over a batch
+# Models take precision= (a Policy, a preset name or None for the global
+# default) and keep everything on the compute path in policy.compute.
+# Inputs of another dtype are converted once when they enter a model, so
+# a float64 training matrix never turns a float32 model's matrix products
+# into float64 ones.
+#
+# float32 is the default everywhere: it halves the memory traffic of the
+# matrix products compared to float64. float16 is for storage only, there
+# is no fast float16 matrix product on the CPU. A float64 accumulator
+# keeps large batch gradient sums exact to float32 precision, at the cost
+# of a widened copy of the batch signals per product.
+
+Policy = collections.namedtuple('Policy', ['compute', 'storage', 'accumulate'])
+
+PRESETS = {
+    'float32': Policy(np.dtype(np.float32), np.dtype(np.float32), np.dtype(np.float32)),
+    'float16storage': Policy(np.dtype(np.float32), np.dtype(np.float16), np.dtype(np.float32)),
+    'float64accumulate': Policy(np.dtype(np.float32), np.dtype(np.float32), np.dtype(np.float64)),
+    'float64': Policy(np.dtype(np.float64), np.dtype(np.float64), np.dtype(np.float64)),
+}
+
+_default = PRESETS['float32']
+
+
+def policy(compute=np.float32, storage=None, accumulate=None):
+    # storage and accumulate default to the compute dtype
+    compute = np.dtype(compute)
+    storage = np.dtype(storage or compute)
+    accumulate = np.dtype(accumulate or compute)
+    for dtype in (compute, storage, accumulate):
+        if dtype.kind != 'f':
+            raise ValueError("precision dtypes must be floating point, not %s" % dtype)
+    if compute == np.float16:
+        raise ValueError("float16 is a storage dtype, compute in float32 or float64")
+    if accumulate.itemsize < compute.itemsize:
+        raise ValueError("accumulate dtype %s is narrower than compute dtype %s" %
+                         (accumulate, compute))
+    return Policy(compute, storage, accumulate)
+
+
+def policyFor(precision=None):
+    # None -> the global default, a name -> the preset, a Policy as is
+    if precision is None:
+        return _default
+    if isinstance(precision, Policy):
+        return precision
+    try:
+        return PRESETS[precision]
+    except KeyError:
+        raise ValueError("unknown precision '%s', expected one of %s" %
+                         (precision, ", ".join(sorted(PRESETS)))) from None
+
+
+def setDefault(precision):
+    # global default for models created after this call
+    global _default
+    _default = policyFor(precision)
+
+
+def getDefault():
+    return _default
+
+
+def toDict(p):
+    return {'compute': p.compute.name, 'storage': p.storage.name, 'accumulate': p.accumulate.name}
+
+
+def fromDict(d):
+    return policy(d['compute'], d['storage'], d['accumulate'])
+
+
+def asCompute(array, dtype):
+    # array in dtype, copied only when it is in another dtype
+    return np.asarray(array, dtype=dtype)
+
+
+def main():
+    import time
+
+    import nn3
+
+    print("\nBegin precision demo \n")
+
+    allData = nn3.makeData(64, 32, 10, 20000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+
+    print("policy              epoch ms   ms error   accuracy")
+    for name in ('float64', 'float32', 'float64accumulate'):
+        nn = nn3.NeuralNetwork(64, 256, 10, seed=13, maxBatch=256, precision=name)
+        nn.trainMiniBatch(trainData, 1, 0.01, 256)  # warm up
+        start = time.perf_counter()
+        nn.trainMiniBatch(trainData, 5, 0.01, 256)
+        epochSeconds = (time.perf_counter() - start) / 5
+        print("%-17s  %9.1f   %8.4f   %8.4f" %
+              (name, epochSeconds * 1000, nn.meanSquaredError(testData), nn.accuracy(testData)))
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
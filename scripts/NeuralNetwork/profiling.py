@@ -0,0 +1,165 @@
+# profiling.py
+# Python 3.x
+
+import collections
+import json
+import time
+
+# Per phase timing for the training loops, the Python counterpart of the
+# Utils.Stopwatch used in NeuralNetwork.gd.
+#
+# Training is split into the phases of the README's "Batch steps": load
+# (gathering a batch), activation (forward pass), delta (node signals),
+# gradient (gradient increments) and update (weight update), plus
+# evaluate for the periodic error reports. Models keep a profiler in
+# .profiler and call begin() when a batch starts and mark(phase) when a
+# phase ends; the time since the previous mark is charged to that phase.
+# That is one clock read per phase, and nothing at all with the default
+# NULL profiler.
+#
+#   nn.profiler = profiling.Profiler()
+#   nn.trainMiniBatch(...)
+#   print(nn.profiler.report())
+
+LOAD = 0
+ACTIVATION = 1
+DELTA = 2
+GRADIENT = 3
+UPDATE = 4
+EVALUATE = 5
+PHASES = ('load', 'activation', 'delta', 'gradient', 'update', 'evaluate')
+
+PhaseStats = collections.namedtuple('PhaseStats', ['calls', 'seconds', 'meanSeconds', 'share'])
+# calls        number of timed intervals
+# seconds      total time
+# meanSeconds  seconds / calls
+# share        fraction of the time over all phases
+
+
+class NullProfiler:
+    # does nothing, the default for every model
+    def reset(self):
+        pass
+
+    def begin(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def stats(self):
+        return {}
+
+
+NULL = NullProfiler()
+
+
+class Profiler:
+
+    def __init__(self):
+        self.clock = time.perf_counter_ns
+        self.reset()
+
+    def reset(self):
+        self.totals = [0] * len(PHASES)  # nanoseconds
+        self.counts = [0] * len(PHASES)
+        self.last = self.clock()
+
+    def begin(self):
+        self.last = self.clock()
+
+    def mark(self, phase):
+        now = self.clock()
+        self.totals[phase] += now - self.last
+        self.counts[phase] += 1
+        self.last = now
+
+    def stats(self):
+        # phase name -> PhaseStats, phases that never ran are left out
+        total = sum(self.totals) or 1
+        result = {}
+        for (phase, name) in enumerate(PHASES):
+            if self.counts[phase]:
+                seconds = self.totals[phase] * 1.0e-9
+                result[name] = PhaseStats(self.counts[phase], seconds,
+                                          seconds / self.counts[phase],
+                                          self.totals[phase] / total)
+        return result
+
+    def report(self):
+        lines = ["phase            calls     total ms    mean us    share"]
+        for (name, s) in self.stats().items():
+            lines.append("%-10s  %10d  %11.2f  %9.2f  %6.1f%%" %
+                         (name, s.calls, s.seconds * 1.0e3, s.meanSeconds * 1.0e6, s.share * 100))
+        return "\n".join(lines)
+
+
+class TraceProfiler(Profiler):
+    # also keeps every interval, up to maxEvents, for writeChromeTrace
+    def __init__(self, maxEvents=1000000):
+        self.maxEvents = maxEvents
+        Profiler.__init__(self)
+
+    def reset(self):
+        Profiler.reset(self)
+        self.events = []  # (phase, start ns, end ns)
+
+    def mark(self, phase):
+        now = self.clock()
+        self.totals[phase] += now - self.last
+        self.counts[phase] += 1
+        if len(self.events) < self.maxEvents:
+            self.events.append((phase, self.last, now))
+        self.last = now
+
+    def writeChromeTrace(self, path):
+        # trace event JSON for chrome://tracing or Perfetto
+        origin = self.events[0][1] if self.events else 0
+        events = [{'name': PHASES[phase], 'cat': 'train', 'ph': 'X', 'pid': 0, 'tid': 0,
+                   'ts': (start - origin) / 1000.0, 'dur': (end - start) / 1000.0}
+                  for (phase, start, end) in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def main():
+    import os
+    import tempfile
+
+    import nn3
+
+    print("\nBegin profiling demo \n")
+
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, _) = nn3.splitData(allData, trainPct=0.80)
+    maxEpochs = 20
+
+    def timeTraining(profiler, batchSize):
+        nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=batchSize)
+        nn.profiler = profiler
+        profiler.reset()
+        start = time.perf_counter()
+        nn.trainMiniBatch(trainData, maxEpochs, 0.01, batchSize)
+        return time.perf_counter() - start
+
+    for batchSize in (1, 16):
+        profiler = Profiler()
+        untimed = min(timeTraining(NULL, batchSize) for _ in range(5))
+        timed = min(timeTraining(profiler, batchSize) for _ in range(5))
+        print("Mini-batch size " + str(batchSize) + ", " + str(maxEpochs) + " epochs")
+        print(profiler.report())
+        print("Overhead vs no profiler = %0.1f%% \n" % ((timed / untimed - 1.0) * 100))
+
+    profiler = TraceProfiler()
+    timeTraining(profiler, 16)
+    path = os.path.join(tempfile.mkdtemp(), "trace.json")
+    profiler.writeChromeTrace(path)
+    print("Wrote " + str(len(profiler.events)) + " trace events to " + path)
+
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
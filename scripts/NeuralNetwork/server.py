@@ -0,0 +1,246 @@
+# server.py
+# Python 3.x
+
+import asyncio
+import collections
+import os
+import time
+
+import numpy as np
+
+import checkpoint
+import layerstack
+import nn3
+
+# Inference service for trained models.
+#
+# Clients connect to a local (Unix domain) socket and send one sample at a
+# time as ni raw float32 values; the reply is the no float32 output values.
+# Requests that arrive within maxDelay seconds of each other are stacked
+# into one preallocated input matrix and answered with a single forward
+# pass, up to maxBatch rows at a time. Every connection handles one request
+# at a time, so concurrency comes from having many connections. If a
+# forward pass fails, every request in its batch gets the error and its
+# connection is closed; the server goes on with the next batch.
+#
+# Models are loaded from a checkpoint (see checkpoint.py) of an
+# nn3.NeuralNetwork or a LayerStack. Both use the same weight layout, an
+# nn3 checkpoint is served as a LayerStack over its weights.
+
+ServerStats = collections.namedtuple(
+    'ServerStats', ['requests', 'batches', 'meanBatch', 'p50', 'p99', 'throughput'])
+# requests    answered since start (or the last resetStats)
+# batches     forward passes run
+# meanBatch   requests per forward pass
+# p50, p99    latency in seconds, request read to reply written
+# throughput  requests per second over the measured interval
+
+
+def loadModel(path, maxBatch=1):
+    # a LayerStack from a checkpoint of a LayerStack or an nn3.NeuralNetwork,
+    # the weights are mapped read-only
+    model = checkpoint.load(path, maxBatch=maxBatch).model
+    if isinstance(model, nn3.NeuralNetwork):
+        model = layerstack.LayerStack(model.layerSizes, model.activations, seed=0,
+                                      maxBatch=maxBatch, loss=model.loss,
+                                      weights=model.weights, precision=model.precision)
+    elif not isinstance(model, layerstack.LayerStack):
+        raise TypeError("cannot serve a %s" % type(model).__name__)
+    return model
+
+
+class InferenceServer:
+
+    def __init__(self, model, maxBatch=64, maxDelay=0.001, maxSamples=100000):
+        # model needs ni, no, resizeWorkspace and a computeOutputsBatch
+        # that returns the output rows (a LayerStack)
+        self.model = model
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay  # seconds to wait for more requests
+        self.requestBytes = model.ni * 4
+
+        model.resizeWorkspace(maxBatch)
+        self.inputs = np.zeros(shape=[maxBatch, model.ni], dtype=model.dtype)
+        # ring of the latest request latencies, in seconds
+        self.latencies = np.zeros(shape=[maxSamples], dtype=np.float64)
+
+        self.queue = None
+        self.server = None
+        self.batcher = None
+        self.resetStats()
+
+    def resetStats(self):
+        self.numRequests = 0
+        self.numBatches = 0
+        self.firstTime = None
+        self.lastTime = None
+
+    def stats(self):
+        n = min(self.numRequests, len(self.latencies))
+        if n == 0:
+            return ServerStats(0, self.numBatches, 0.0, 0.0, 0.0, 0.0)
+        (p50, p99) = np.percentile(self.latencies[:n], [50, 99])
+        elapsed = self.lastTime - self.firstTime
+        throughput = self.numRequests / elapsed if elapsed > 0 else 0.0
+        return ServerStats(self.numRequests, self.numBatches,
+                           self.numRequests / max(1, self.numBatches),
+                           float(p50), float(p99), throughput)
+
+    async def start(self, path):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.ensure_future(self.batchLoop())
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = await asyncio.start_unix_server(self.handle, path=path)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def infer(self, data):
+        # data is ni float32 values as bytes, returns the reply bytes
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((data, future))
+        return await future
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                data = await reader.readexactly(self.requestBytes)
+                start = time.perf_counter()
+                writer.write(await self.infer(data))
+                await writer.drain()
+                self.record(start, time.perf_counter())
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass  # client went away
+        except Exception as e:
+            # the forward pass failed, the client sees the connection close
+            print("Request failed: " + str(e))
+        finally:
+            writer.close()
+
+    def record(self, start, stop):
+        self.latencies[self.numRequests % len(self.latencies)] = stop - start
+        self.numRequests += 1
+        if self.firstTime is None:
+            self.firstTime = start
+        self.lastTime = stop
+
+    async def batchLoop(self):
+        pending = []
+        while True:
+            pending.append(await self.queue.get())
+            # give concurrent requests one window to arrive, unless a full
+            # batch is already waiting
+            if self.maxDelay > 0 and self.queue.qsize() < self.maxBatch - 1:
+                await asyncio.sleep(self.maxDelay)
+            while len(pending) < self.maxBatch and not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            self.runBatch(pending)
+            pending.clear()
+
+    def runBatch(self, pending):
+        n = len(pending)
+        inputs = self.inputs[:n]
+        try:
+            for (i, (data, _)) in enumerate(pending):
+                inputs[i] = np.frombuffer(data, dtype=np.float32)
+            outputs = self.model.computeOutputsBatch(inputs)
+        except Exception as e:
+            # fail this batch's requests, not the loop
+            for (_, future) in pending:
+                if not future.cancelled():
+                    future.set_exception(e)
+            return
+        self.numBatches += 1
+        for (i, (_, future)) in enumerate(pending):
+            if not future.cancelled():
+                # float32 on the wire whatever the model computes in
+                future.set_result(outputs[i].astype(np.float32, copy=False).tobytes())
+
+# end class InferenceServer
+
+
+async def runClients(path, xValues, numOutputs, numClients, requestsPerClient):
+    # local client stand-in: numClients connections, each sending
+    # requestsPerClient rows of xValues one after the other. Returns the
+    # replies as a (numClients, requestsPerClient, numOutputs) matrix.
+    xValues = np.ascontiguousarray(xValues, dtype=np.float32)
+    results = np.zeros(shape=[numClients, requestsPerClient, numOutputs], dtype=np.float32)
+
+    async def client(c):
+        (reader, writer) = await asyncio.open_unix_connection(path)
+        for r in range(requestsPerClient):
+            row = xValues[(c * requestsPerClient + r) % len(xValues)]
+            writer.write(row.tobytes())
+            reply = await reader.readexactly(numOutputs * 4)
+            results[c, r] = np.frombuffer(reply, dtype=np.float32)
+        writer.close()
+        await writer.wait_closed()
+
+    await asyncio.gather(*(client(c) for c in range(numClients)))
+    return results
+
+
+def main():
+    import tempfile
+
+    print("\nBegin inference server demo \n")
+
+    allData = nn3.makeData(4, 5, 3, 1000, nn_seed=1)
+    (trainData, testData) = nn3.splitData(allData, trainPct=0.80)
+    print("Training a 4-7-3 network")
+    nn = nn3.NeuralNetwork(4, 7, 3, seed=13, maxBatch=16)
+    nn.trainMiniBatch(trainData, 50, 0.01, 16)
+
+    directory = tempfile.mkdtemp()
+    checkpointPath = os.path.join(directory, "model.ckpt")
+    socketPath = os.path.join(directory, "nn.sock")
+    checkpoint.save(checkpointPath, nn, epoch=50)
+    print("Saved checkpoint to " + checkpointPath)
+
+    numClients = 32
+    requestsPerClient = 200
+    xValues = testData[:, :4]
+
+    async def serve(maxDelay):
+        model = loadModel(checkpointPath)
+        server = InferenceServer(model, maxBatch=64, maxDelay=maxDelay)
+        await server.start(socketPath)
+        async with server:
+            results = await runClients(socketPath, xValues, model.no,
+                                       numClients, requestsPerClient)
+        return (server.stats(), results)
+
+    print("\n" + str(numClients) + " clients x " + str(requestsPerClient) +
+          " requests over " + socketPath + "\n")
+    print("window ms   requests/sec   mean batch   p50 ms   p99 ms")
+    for maxDelay in (0.0, 0.0005, 0.002):
+        (stats, results) = asyncio.run(serve(maxDelay))
+        print("%9.1f   %12.0f   %10.1f   %6.3f   %6.3f" %
+              (maxDelay * 1000, stats.throughput, stats.meanBatch,
+               stats.p50 * 1000, stats.p99 * 1000))
+
+    # replies match a direct forward pass over the same rows
+    rows = np.arange(numClients * requestsPerClient) % len(xValues)
+    expected = nn.computeOutputsBatch(xValues[rows])[1]
+    difference = np.abs(results.reshape(expected.shape) - expected).max()
+    print("\nLargest difference from direct forward pass = %0.2e " % difference)
+    print("\nEnd demo ")
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
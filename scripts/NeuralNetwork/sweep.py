@@ -0,0 +1,237 @@
+# sweep.py
+# Python 3.x
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from callbacks import Callback
+from dataset import MemmapDataset
+import nn3
+
+# Hyperparameter sweeps for nn3.NeuralNetwork.
+#
+# A search space is a list of trial configs (hidden size, learn rate,
+# batch size, seed), from gridSpace for every combination or randomSpace
+# for a number of random draws with log-uniform learn rates. Trials run on
+# a process pool. The dataset is written once to a raw float32 file and
+# every worker maps it read-only through MemmapDataset, so the rows are
+# shared through the page cache instead of being pickled per trial.
+#
+# Bad trials are stopped early by median pruning: every `every` epochs a
+# trial measures its validation error and stops if it is above the median
+# error that finished trials had at the same epoch. The medians come from
+# the trials done when a trial is started, so with more than one worker
+# which trials get pruned depends on the order they finish in. Diverged
+# trials (a non-finite error) always stop.
+#
+# Run with OPENBLAS_NUM_THREADS=1 (or the equivalent for your BLAS) so
+# each worker stays on one core.
+
+COLUMNS = ['trial', 'numHidden', 'learnRate', 'batchSize', 'seed', 'epochs',
+           'pruned', 'validationError', 'validationAccuracy', 'seconds']
+
+# per process state, filled in by _initWorker
+_worker = {}
+
+
+def gridSpace(hiddenSizes, learnRates, batchSizes, seeds):
+    return [dict(numHidden=h, learnRate=r, batchSize=b, seed=s)
+            for (h, r, b, s) in itertools.product(hiddenSizes, learnRates, batchSizes, seeds)]
+
+
+def randomSpace(numTrials, hiddenSizes, learnRateRange, batchSizes, seeds, seed=0):
+    # hidden sizes, batch sizes and seeds are picked from the lists, learn
+    # rates log-uniformly from learnRateRange = (lo, hi)
+    rng = np.random.default_rng(seed)
+    (lo, hi) = (math.log(learnRateRange[0]), math.log(learnRateRange[1]))
+    return [dict(numHidden=int(rng.choice(hiddenSizes)),
+                 learnRate=float(math.exp(rng.uniform(lo, hi))),
+                 batchSize=int(rng.choice(batchSizes)),
+                 seed=int(rng.choice(seeds)))
+            for _ in range(numTrials)]
+
+
+class MedianPruning(Callback):
+    # stops a trial whose validation error is above medians[epoch], from
+    # epoch minEpochs on. curve collects (epoch, error) for every check,
+    # epochs is the number of epochs trained.
+    def __init__(self, validationData, medians, every=5, minEpochs=10):
+        self.validationData = validationData
+        self.medians = medians
+        self.every = every
+        self.minEpochs = minEpochs
+        self.curve = []
+        self.pruned = False
+        self.epochs = 0
+
+    def epochEnd(self, epoch, logs):
+        if epoch % self.every != 0:
+            return
+        error = self.model.meanSquaredError(self.validationData)
+        self.curve.append((epoch, error))
+        median = self.medians.get(epoch)
+        if not math.isfinite(error) or (epoch >= self.minEpochs and median is not None and
+                                        error > median):
+            self.pruned = True
+            logs['stop'] = True
+
+    def trainEnd(self, logs):
+        self.epochs = logs.get('epoch', 0)
+
+
+def _initWorker(path, numFeatures, numClasses, trainPct):
+    data = MemmapDataset(path, numFeatures, numClasses)
+    (_worker['train'], _worker['validation']) = data.split(trainPct)
+    _worker['data'] = data  # keep the mapping alive
+
+
+def runTrial(task):
+    (trial, config, maxEpochs, medians, every, minEpochs) = task
+    (trainData, validationData) = (_worker['train'].rows, _worker['validation'].rows)
+    numFeatures = _worker['data'].numFeatures
+    numClasses = _worker['data'].numClasses
+
+    start = time.perf_counter()
+    nn = nn3.NeuralNetwork(numFeatures, config['numHidden'], numClasses, seed=config['seed'],
+                           maxBatch=config['batchSize'])
+    pruner = MedianPruning(validationData, medians, every, minEpochs)
+    # verbose=False, no training error every 25 epochs from the workers
+    nn.trainMiniBatch(trainData, maxEpochs, config['learnRate'], config['batchSize'],
+                      callbacks=[pruner], verbose=False)
+    return dict(config, trial=trial, epochs=pruner.epochs, pruned=pruner.pruned,
+                validationError=nn.meanSquaredError(validationData),
+                validationAccuracy=nn.accuracy(validationData),
+                seconds=time.perf_counter() - start, curve=pruner.curve)
+
+
+def medianCurve(results):
+    # epoch -> median validation error over the finished trials. Errors of
+    # diverged trials (nan or inf) are left out, a nan median would stop
+    # pruning at that epoch since no error compares above it.
+    errors = {}
+    for result in results:
+        for (epoch, error) in result['curve']:
+            if math.isfinite(error):
+                errors.setdefault(epoch, []).append(error)
+    return {epoch: float(np.median(values)) for (epoch, values) in errors.items()}
+
+
+def runSweep(data, space, maxEpochs, numWorkers=None, trainPct=0.80, every=5, minEpochs=10,
+             verbose=True):
+    # data is a MemmapDataset (MemmapDataset.fromArray for a matrix in
+    # memory), the first trainPct of its rows are trained on and the rest
+    # are the validation set. Returns one result dict per trial, in trial
+    # order.
+    numWorkers = numWorkers or os.cpu_count() or 1
+
+    pending = list(enumerate(space))
+    running = []
+    results = []
+    with mp.Pool(numWorkers, initializer=_initWorker,
+                 initargs=(data.path, data.numFeatures, data.numClasses, trainPct)) as pool:
+        while pending or running:
+            # keep every worker busy, each trial gets the medians known now
+            while pending and len(running) < numWorkers:
+                (trial, config) = pending.pop(0)
+                task = (trial, config, maxEpochs, medianCurve(results), every, minEpochs)
+                running.append(pool.apply_async(runTrial, (task,)))
+            finished = [r for r in running if r.ready()]
+            if not finished:
+                time.sleep(0.005)
+                continue
+            for r in finished:
+                running.remove(r)
+                result = r.get()
+                results.append(result)
+                if verbose:
+                    print(formatRow(result))
+
+    results.sort(key=lambda result: result['trial'])
+    return results
+
+# -----
+# results table
+
+
+def formatRow(result):
+    return ("%5d  %6d  %9.5f  %5d  %4d  %6d  %6s  %10.4f  %8.4f  %7.2f" %
+            tuple(result[c] for c in COLUMNS))
+
+
+def formatTable(results, sortBy='validationError', descending=False):
+    lines = ["trial  hidden  learnRate  batch  seed  epochs  pruned  validation  accuracy  seconds"]
+    for result in sorted(results, key=lambda result: result[sortBy], reverse=descending):
+        lines.append(formatRow(result))
+    return "\n".join(lines)
+
+
+def writeCsv(path, results):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for nn3.NeuralNetwork.")
+    parser.add_argument("--hidden", nargs="+", type=int, default=[4, 7, 16], help="Hidden layer sizes")
+    parser.add_argument("--learn-rates", nargs="+", type=float, default=[0.001, 0.01, 0.1],
+                        help="Learn rates for a grid, or the lo hi range for --random")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 16], help="Mini-batch sizes")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[13], help="Weight init seeds")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="Random search with N trials instead of the full grid")
+    parser.add_argument("--epochs", type=int, default=100, help="Maximum epochs per trial")
+    parser.add_argument("--every", type=int, default=5, help="Epochs between pruning checks")
+    parser.add_argument("--min-epochs", type=int, default=10, help="Epochs before a trial can be pruned")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--data", default=None,
+                        help="Raw float32 dataset file (see dataset.py), default: synthetic 4-5-3 data")
+    parser.add_argument("--features", type=int, default=4, help="Input columns of --data")
+    parser.add_argument("--classes", type=int, default=3, help="Target columns of --data")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows of synthetic data")
+    parser.add_argument("--sort", default='validationError', choices=COLUMNS, help="Column to sort by")
+    parser.add_argument("--descending", action='store_true', help="Sort largest first")
+    parser.add_argument("-o", "--output", default=None, help="Also write the results as CSV")
+    args = parser.parse_args()
+
+    if args.random:
+        if len(args.learn_rates) != 2:
+            parser.error("--random takes a lo hi range in --learn-rates")
+        space = randomSpace(args.random, args.hidden, args.learn_rates, args.batch_sizes, args.seeds)
+    else:
+        space = gridSpace(args.hidden, args.learn_rates, args.batch_sizes, args.seeds)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.data is None:
+            data = MemmapDataset.generate(os.path.join(directory, "sweep.f32"), 4, 5, 3,
+                                          args.rows, seed=1)
+        else:
+            data = MemmapDataset(args.data, args.features, args.classes)
+
+        print("Running " + str(len(space)) + " trials on " + str(len(data)) + " rows \n")
+        start = time.perf_counter()
+        results = runSweep(data, space, args.epochs, args.workers, every=args.every,
+                           minEpochs=args.min_epochs)
+        elapsed = time.perf_counter() - start
+
+    numPruned = sum(result['pruned'] for result in results)
+    print("\n" + formatTable(results, args.sort, args.descending))
+    print("\n%d trials, %d pruned, %0.1f s " % (len(results), numPruned, elapsed))
+    if args.output:
+        writeCsv(args.output, results)
+        print("Wrote " + args.output)
+
+
+if __name__ == "__main__":
+    main()
+
+# end script
@@ -0,0 +1,157 @@
+# test_vectorized.py
+# Python 3.x
+
+import math
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts', 'NeuralNetwork'))
+
+import nn3  # noqa: E402
+
+# The vectorized nn3 trainOnline and trainBatch should give the weights
+# of the original per element loops, to float32 rounding. LoopNetwork is
+# that loop code (tanh hidden layer, softmax output, squared error,
+# plain gradient descent), started from the same seed so the initial
+# weights and the shuffle order are the same.
+
+TOLERANCE = 1.0e-5
+
+
+class LoopNetwork:
+
+    def __init__(self, numInput, numHidden, numOutput, seed):
+        (self.ni, self.nh, self.no) = (numInput, numHidden, numOutput)
+        self.iNodes = np.zeros(shape=[self.ni], dtype=np.float32)
+        self.hNodes = np.zeros(shape=[self.nh], dtype=np.float32)
+        self.oNodes = np.zeros(shape=[self.no], dtype=np.float32)
+        self.ihWeights = np.zeros(shape=[self.ni, self.nh], dtype=np.float32)
+        self.hoWeights = np.zeros(shape=[self.nh, self.no], dtype=np.float32)
+        self.hBiases = np.zeros(shape=[self.nh], dtype=np.float32)
+        self.oBiases = np.zeros(shape=[self.no], dtype=np.float32)
+        self.rnd = random.Random(seed)
+
+        numWts = nn3.NeuralNetwork.totalWeights(self.ni, self.nh, self.no)
+        wts = np.zeros(shape=[numWts], dtype=np.float32)
+        for idx in range(numWts):
+            wts[idx] = 0.02 * self.rnd.random() - 0.01
+        self.setWeights(wts)
+
+    def setWeights(self, weights):
+        idx = 0
+        for i in range(self.ni):
+            for j in range(self.nh):
+                self.ihWeights[i, j] = weights[idx]
+                idx += 1
+        for j in range(self.nh):
+            self.hBiases[j] = weights[idx]
+            idx += 1
+        for j in range(self.nh):
+            for k in range(self.no):
+                self.hoWeights[j, k] = weights[idx]
+                idx += 1
+        for k in range(self.no):
+            self.oBiases[k] = weights[idx]
+            idx += 1
+
+    def getWeights(self):
+        return np.concatenate([self.ihWeights.ravel(), self.hBiases,
+                               self.hoWeights.ravel(), self.oBiases])
+
+    def computeOutputs(self, xValues):
+        hSums = np.zeros(shape=[self.nh], dtype=np.float32)
+        oSums = np.zeros(shape=[self.no], dtype=np.float32)
+        for i in range(self.ni):
+            self.iNodes[i] = xValues[i]
+        for j in range(self.nh):
+            for i in range(self.ni):
+                hSums[j] += self.iNodes[i] * self.ihWeights[i, j]
+            hSums[j] += self.hBiases[j]
+            self.hNodes[j] = math.tanh(hSums[j])
+        for k in range(self.no):
+            for j in range(self.nh):
+                oSums[k] += self.hNodes[j] * self.hoWeights[j, k]
+            oSums[k] += self.oBiases[k]
+        m = max(oSums)
+        divisor = sum(math.exp(oSums[k] - m) for k in range(self.no))
+        for k in range(self.no):
+            self.oNodes[k] = math.exp(oSums[k] - m) / divisor
+
+    def gradients(self, row):
+        # (ihGrads, hbGrads, hoGrads, obGrads) for one training row
+        self.computeOutputs(row[:self.ni])
+        oSignals = np.zeros(shape=[self.no], dtype=np.float32)
+        hSignals = np.zeros(shape=[self.nh], dtype=np.float32)
+        for k in range(self.no):
+            derivative = (1 - self.oNodes[k]) * self.oNodes[k]
+            oSignals[k] = derivative * (self.oNodes[k] - row[self.ni + k])
+        hoGrads = np.zeros(shape=[self.nh, self.no], dtype=np.float32)
+        for j in range(self.nh):
+            for k in range(self.no):
+                hoGrads[j, k] = oSignals[k] * self.hNodes[j]
+        for j in range(self.nh):
+            total = 0.0
+            for k in range(self.no):
+                total += oSignals[k] * self.hoWeights[j, k]
+            hSignals[j] = (1 - self.hNodes[j]) * (1 + self.hNodes[j]) * total
+        ihGrads = np.zeros(shape=[self.ni, self.nh], dtype=np.float32)
+        for i in range(self.ni):
+            for j in range(self.nh):
+                ihGrads[i, j] = hSignals[j] * self.iNodes[i]
+        return (ihGrads, hSignals.copy(), hoGrads, oSignals.copy())
+
+    def update(self, grads, learnRate):
+        (ihGrads, hbGrads, hoGrads, obGrads) = grads
+        for i in range(self.ni):
+            for j in range(self.nh):
+                self.ihWeights[i, j] += -1.0 * learnRate * ihGrads[i, j]
+        for j in range(self.nh):
+            self.hBiases[j] += -1.0 * learnRate * hbGrads[j]
+        for j in range(self.nh):
+            for k in range(self.no):
+                self.hoWeights[j, k] += -1.0 * learnRate * hoGrads[j, k]
+        for k in range(self.no):
+            self.oBiases[k] += -1.0 * learnRate * obGrads[k]
+
+    def trainOnline(self, trainData, maxEpochs, learnRate):
+        indices = np.arange(len(trainData))
+        for epoch in range(maxEpochs):
+            self.rnd.shuffle(indices)
+            for idx in indices:
+                self.update(self.gradients(trainData[idx]), learnRate)
+        return self.getWeights()
+
+    def trainBatch(self, trainData, maxEpochs, learnRate):
+        for epoch in range(maxEpochs):
+            summed = [np.zeros_like(w) for w in (self.ihWeights, self.hBiases,
+                                                 self.hoWeights, self.oBiases)]
+            for row in trainData:
+                for (total, grads) in zip(summed, self.gradients(row)):
+                    total += grads
+            self.update(summed, learnRate)
+        return self.getWeights()
+
+# end class LoopNetwork
+
+
+def makeTrainData():
+    return nn3.makeData(4, 5, 3, 40, nn_seed=1).astype(np.float32)
+
+
+def test_trainOnline_matches_loops():
+    trainData = makeTrainData()
+    expected = LoopNetwork(4, 5, 3, seed=13).trainOnline(trainData, 5, 0.05)
+    result = nn3.NeuralNetwork(4, 5, 3, seed=13).trainOnline(trainData, 5, 0.05)
+    np.testing.assert_allclose(result, expected, rtol=0.0, atol=TOLERANCE)
+
+
+def test_trainBatch_matches_loops():
+    trainData = makeTrainData()
+    expected = LoopNetwork(4, 5, 3, seed=13).trainBatch(trainData, 20, 0.05)
+    result = nn3.NeuralNetwork(4, 5, 3, seed=13).trainBatch(trainData, 20, 0.05)
+    np.testing.assert_allclose(result, expected, rtol=0.0, atol=TOLERANCE)
+
+# end script
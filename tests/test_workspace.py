@@ -0,0 +1,106 @@
+# test_workspace.py
+# Python 3.x
+
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts', 'NeuralNetwork'))
+
+import nn  # noqa: E402
+import nn3  # noqa: E402
+
+# The training steps of nn3 and nn run in preallocated workspaces, so
+# once warmed up a step should not allocate anything that lives on, and
+# nothing as large as a workspace buffer even for a moment. tracemalloc
+# sees NumPy's array allocations, a per-step temporary the size of the
+# hidden layer would show up in the peak.
+
+BATCH = 256
+HIDDEN = 512
+WARMUP_STEPS = 5
+STEPS = 200
+# small Python objects tracemalloc happens to see during the run
+SLACK_BYTES = 16 * 1024
+
+
+def peakAllowance(dtype):
+    # NumPy ufuncs that broadcast (adding the biases) iterate through an
+    # internal buffer of np.getbufsize() elements, a fixed size that does
+    # not grow with the batch
+    return SLACK_BYTES + np.getbufsize() * np.dtype(dtype).itemsize
+
+
+def makeBatch():
+    data = nn3.makeData(4, 5, 3, BATCH, nn_seed=1)
+    return (data[:, :4].astype(np.float32), data[:, 4:].astype(np.float32))
+
+
+def measure(step):
+    # (growth of traced memory, peak above the start) over STEPS steps
+    # after warming up
+    for _ in range(WARMUP_STEPS):
+        step()
+    tracemalloc.start()
+    try:
+        (start, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(STEPS):
+            step()
+        (current, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (current - start, peak - start)
+
+
+def test_nn3_step_does_not_allocate():
+    (xValues, tValues) = makeBatch()
+    net = nn3.NeuralNetwork(4, HIDDEN, 3, seed=13, maxBatch=BATCH)
+
+    def step():
+        grads = net.computeGradients(xValues, tValues)
+        net.updateWeights(grads, 0.01)
+
+    (growth, peak) = measure(step)
+    assert growth < SLACK_BYTES
+    assert peak < min(peakAllowance(net.dtype), net.hNodesBatch.nbytes)
+
+
+def test_nn3_float64_step_does_not_allocate():
+    # the train loops convert the data to the compute dtype once, targets
+    # included, after that a step stays in the workspaces
+    (xValues, tValues) = makeBatch()
+    net = nn3.NeuralNetwork(4, HIDDEN, 3, seed=13, maxBatch=BATCH, precision='float64')
+    (xValues, tValues) = (xValues.astype(net.dtype), tValues.astype(net.dtype))
+
+    def step():
+        grads = net.computeGradients(xValues, tValues)
+        net.updateWeights(grads, 0.01)
+
+    (growth, peak) = measure(step)
+    assert growth < SLACK_BYTES
+    assert peak < min(peakAllowance(net.dtype), net.hNodesBatch.nbytes)
+
+
+def test_nn_step_does_not_allocate():
+    (xValues, tValues) = makeBatch()
+    net = nn.NeuralNetwork(4, HIDDEN, 3, max_batch=BATCH)
+
+    def step():
+        net.backpropagation(xValues, tValues, 0.01)
+
+    (growth, peak) = measure(step)
+    assert growth < SLACK_BYTES
+    assert peak < min(peakAllowance(net.dtype), net.hidden_buffer.nbytes)
+
+
+def test_nn3_compute_outputs_returns_a_copy():
+    net = nn3.NeuralNetwork(4, 7, 3, seed=13)
+    first = net.computeOutputs(np.array([0.1, 0.2, 0.3, 0.4]))
+    kept = first.copy()
+    net.computeOutputs(np.array([-0.4, 0.3, -0.2, 0.1]))
+    assert np.array_equal(first, kept)
+
+# end script